@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analytics'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .guards import QueryGuard
+        from . import signals  # noqa: F401
+
+        connection_created.connect(QueryGuard.install_progress_handler)
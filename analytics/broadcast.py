@@ -0,0 +1,141 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from .services import AnalyticsService
+
+
+class ViewBroadcaster:
+    """
+    In-process fan-out of recorded views to live subscribers.
+
+    ``publish`` only bumps a counter in the open batch. Batches are sealed at
+    most once per ``ANALYTICS_LIVE_INTERVAL`` into a short numbered history,
+    and each subscriber reads every batch it has not seen yet, merged into a
+    single event. A client that falls further behind than the history gets a
+    ``resync`` event instead of an unbounded queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = 0
+        self._batch = {}
+        self._batch_started = None
+        self._history = deque()
+        self._seq = 0
+        self._totals = None
+        self._top = []
+
+    @staticmethod
+    def interval():
+        return getattr(settings, 'ANALYTICS_LIVE_INTERVAL', 1.0)
+
+    @staticmethod
+    def top_n():
+        return getattr(settings, 'ANALYTICS_LIVE_TOP_N', 10)
+
+    @staticmethod
+    def history_size():
+        return getattr(settings, 'ANALYTICS_LIVE_HISTORY', 120)
+
+    def publish(self, blog_id, delta=1):
+        if not self._subscribers:
+            return
+
+        with self._lock:
+            if not self._batch:
+                self._batch_started = time.monotonic()
+            self._batch[blog_id] = self._batch.get(blog_id, 0) + delta
+
+    def subscribe(self):
+        """
+        Register a subscriber and return the current sequence number. The
+        first subscriber seeds the running totals from the database.
+        """
+        with self._lock:
+            self._subscribers += 1
+            seeded = self._totals is not None
+
+        if not seeded:
+            try:
+                totals = AnalyticsService.get_blog_totals()
+            except Exception:
+                # The caller never gets to unsubscribe.
+                self.unsubscribe()
+                raise
+            with self._lock:
+                if self._totals is None:
+                    self._totals = totals
+                    self._top = self._compute_top()
+
+        with self._lock:
+            return self._seq
+
+    def unsubscribe(self):
+        with self._lock:
+            self._subscribers -= 1
+            if not self._subscribers:
+                # Nobody is listening, so the totals would drift; reseed later.
+                self._batch = {}
+                self._history.clear()
+                self._totals = None
+
+    def top(self):
+        with self._lock:
+            return list(self._top)
+
+    def changes_since(self, seq):
+        """
+        Return ``(seq, deltas, top)`` for everything sealed after ``seq``;
+        ``deltas`` is None when those batches are no longer in the history.
+        ``top`` is None when the top-N did not change.
+        """
+        with self._lock:
+            self._seal_batch()
+            if seq >= self._seq:
+                return seq, {}, None
+            if not self._history or self._history[0][0] > seq + 1:
+                return self._seq, None, list(self._top)
+
+            deltas = {}
+            top_changed = False
+            for batch_seq, batch, changed in self._history:
+                if batch_seq <= seq:
+                    continue
+                top_changed = top_changed or changed
+                for blog_id, delta in batch.items():
+                    deltas[blog_id] = deltas.get(blog_id, 0) + delta
+            return self._seq, deltas, list(self._top) if top_changed else None
+
+    def _seal_batch(self):
+        if not self._batch or time.monotonic() - self._batch_started < self.interval():
+            return
+
+        batch, self._batch = self._batch, {}
+        top_changed = False
+        if self._totals is not None:
+            floor = self._top[-1][1] if len(self._top) >= self.top_n() else 0
+            top_ids = {blog_id for blog_id, _ in self._top}
+            for blog_id, delta in batch.items():
+                self._totals[blog_id] = self._totals.get(blog_id, 0) + delta
+                if blog_id in top_ids or self._totals[blog_id] >= floor:
+                    top_changed = True
+            if top_changed:
+                top = self._compute_top()
+                top_changed = top != self._top
+                self._top = top
+
+        self._seq += 1
+        self._history.append((self._seq, batch, top_changed))
+        while len(self._history) > self.history_size():
+            self._history.popleft()
+
+    def _compute_top(self):
+        return heapq.nlargest(
+            self.top_n(), self._totals.items(), key=lambda item: (item[1], -item[0])
+        )
+
+
+broadcaster = ViewBroadcaster()
@@ -0,0 +1,94 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+class SparseFields:
+    """
+    Serializes rows straight from ``QuerySet.values()`` for a
+    ``ModelSerializer``, without building model instances or running
+    per-field serializer logic.
+
+    Every serializer field maps to the column path of its source, so
+    ``blog_title`` (``source='blog.title'``) reads ``blog__title`` and only
+    then joins the blog table. Values that are already JSON native pass
+    through unchanged; the rest (dates) go through the field's own
+    ``to_representation`` so the output matches the serializer exactly.
+    """
+
+    param = 'fields'
+    _native = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.FloatField,
+        serializers.IntegerField,
+        serializers.RelatedField,
+    )
+
+    @staticmethod
+    def requested(request, serializer_fields):
+        """The field names listed in ``?fields=``, or None when absent."""
+        value = request.query_params.get(SparseFields.param)
+        if not value:
+            return None
+
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in serializer_fields]
+        if unknown:
+            raise ValidationError({SparseFields.param: [
+                f"Unknown field(s): {', '.join(unknown)}. "
+                f"Available: {', '.join(serializer_fields)}."
+            ]})
+        return names
+
+    @staticmethod
+    def columns(serializer_fields, names=None):
+        """``(name, column, convert)`` for each field to output, in serializer order."""
+        columns = []
+        for name, field in serializer_fields.items():
+            if field.write_only or (names is not None and name not in names):
+                continue
+            convert = None if isinstance(field, SparseFields._native) else field.to_representation
+            columns.append((name, '__'.join(field.source_attrs), convert))
+        return columns
+
+    @staticmethod
+    def rows(values, columns):
+        rows = []
+        for row in values:
+            item = {}
+            for name, column, convert in columns:
+                value = row[column]
+                item[name] = value if convert is None or value is None else convert(value)
+            rows.append(item)
+        return rows
+
+
+class SparseFieldsMixin:
+    """
+    Adds ``?fields=a,b`` to a model viewset. Lists select only the columns
+    (and joins) those fields need and skip model instances altogether;
+    single objects drop the fields that were not asked for.
+    """
+
+    def requested_fields(self):
+        return SparseFields.requested(self.request, self.get_serializer_class()().fields)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        names = self.requested_fields()
+        if names is not None:
+            fields = serializer.child.fields if kwargs.get('many') else serializer.fields
+            for name in [name for name in fields if name not in names]:
+                fields.pop(name)
+        return serializer
+
+    def list(self, request, *args, **kwargs):
+        columns = SparseFields.columns(self.get_serializer_class()().fields, self.requested_fields())
+        queryset = self.filter_queryset(self.get_queryset())
+        values = queryset.values(*[column for _, column, _ in columns])
+
+        page = self.paginate_queryset(values)
+        if page is not None:
+            return self.get_paginated_response(SparseFields.rows(page, columns))
+        return Response(SparseFields.rows(values, columns))
@@ -7,28 +7,49 @@ class DynamicFilter:
    
     
     @staticmethod
-    def build_q_object(filters_config):
-       
+    def build_q_object(filters_config, field_aliases=None, lookup_resolver=None):
+        """
+        ``field_aliases`` maps lookup prefixes to shorter paths, e.g.
+        ``{'blog__author': 'author'}`` turns ``blog__author__username`` into
+        ``author__username``. ``lookup_resolver(field, value)`` may return a
+        replacement Q for a single condition, or None to keep it as is.
+        """
         if not filters_config:
             return Q()
         
-        return DynamicFilter._parse_filter(filters_config)
+        return DynamicFilter._parse_filter(filters_config, field_aliases, lookup_resolver)
     
     @staticmethod
-    def _parse_filter(filter_config):
+    def _parse_filter(filter_config, field_aliases=None, lookup_resolver=None):
         if 'and' in filter_config:
-            q_objects = [DynamicFilter._parse_filter(f) for f in filter_config['and']]
+            q_objects = [DynamicFilter._parse_filter(f, field_aliases, lookup_resolver) for f in filter_config['and']]
             return DynamicFilter._combine_q_objects(q_objects, 'and')
         elif 'or' in filter_config:
-            q_objects = [DynamicFilter._parse_filter(f) for f in filter_config['or']]
+            q_objects = [DynamicFilter._parse_filter(f, field_aliases, lookup_resolver) for f in filter_config['or']]
             return DynamicFilter._combine_q_objects(q_objects, 'or')
         elif 'not' in filter_config:
-            return ~DynamicFilter._parse_filter(filter_config['not'])
+            return ~DynamicFilter._parse_filter(filter_config['not'], field_aliases, lookup_resolver)
         elif 'eq' in filter_config:
-            return DynamicFilter._build_equality_q(filter_config['eq'])
+            return DynamicFilter._build_equality_q(filter_config['eq'], field_aliases, lookup_resolver)
         else:
             return Q()
     
+    @staticmethod
+    def lookup_fields(filter_config):
+        """The field lookups ``build_q_object`` would use, in parse order."""
+        if not filter_config:
+            return []
+        if 'and' in filter_config:
+            return [field for f in filter_config['and'] for field in DynamicFilter.lookup_fields(f)]
+        elif 'or' in filter_config:
+            return [field for f in filter_config['or'] for field in DynamicFilter.lookup_fields(f)]
+        elif 'not' in filter_config:
+            return DynamicFilter.lookup_fields(filter_config['not'])
+        elif 'eq' in filter_config:
+            return list(filter_config['eq'])
+        else:
+            return []
+    
     @staticmethod
     def _combine_q_objects(q_objects, operator):
         if not q_objects:
@@ -43,11 +64,30 @@ class DynamicFilter:
         return combined
     
     @staticmethod
-    def _build_equality_q(eq_config):
+    def _build_equality_q(eq_config, field_aliases=None, lookup_resolver=None):
         q_obj = Q()
         for field, value in eq_config.items():
+            resolved = lookup_resolver(field, value) if lookup_resolver else None
+            if resolved is not None:
+                q_obj &= resolved
+                continue
+            field = DynamicFilter._resolve_alias(field, field_aliases)
             q_obj &= Q(**{field: value})
         return q_obj
+    
+    @staticmethod
+    def _resolve_alias(field, field_aliases):
+        if not field_aliases:
+            return field
+        
+        # Longest prefix first so nested paths win over their parents.
+        for prefix in sorted(field_aliases, key=len, reverse=True):
+            target = field_aliases[prefix]
+            if field == prefix or field.startswith(prefix + '__'):
+                return target + field[len(prefix):]
+            if field == prefix + '_id':
+                return target + '_id'
+        return field
 
 class BlogFilter(filters.FilterSet):
     author = NumberFilter(field_name='author', lookup_expr='exact')
@@ -0,0 +1,233 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections, OperationalError
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised when an analytics request is rejected up front or runs past its
+    execution deadline. ``status_code`` is the HTTP status views respond with.
+    """
+
+    def __init__(self, message, status_code=503, estimated_cost=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.estimated_cost = estimated_cost
+
+
+class QueryGuard:
+
+    _state = threading.local()
+    # (timeout, max cost) overrides for background work; see ``limits``.
+    _limits = ContextVar('analytics_query_limits', default=None)
+    _scan_re = re.compile(r'\b(SCAN|SEARCH)\s+(?:TABLE\s+)?"?(\w+)"?')
+
+    @staticmethod
+    def max_filter_nodes():
+        return getattr(settings, 'ANALYTICS_MAX_FILTER_NODES', 64)
+
+    @staticmethod
+    def max_filter_depth():
+        return getattr(settings, 'ANALYTICS_MAX_FILTER_DEPTH', 8)
+
+    @staticmethod
+    def max_query_cost():
+        limits = QueryGuard._limits.get()
+        if limits is not None:
+            return limits[1]
+        return getattr(settings, 'ANALYTICS_MAX_QUERY_COST', 50_000_000)
+
+    @staticmethod
+    def query_timeout():
+        limits = QueryGuard._limits.get()
+        if limits is not None:
+            return limits[0]
+        return getattr(settings, 'ANALYTICS_QUERY_TIMEOUT', 10.0)
+
+    @staticmethod
+    @contextmanager
+    def limits(timeout, max_cost):
+        """
+        Replace the inline timeout and cost limit inside the block, e.g. for
+        background jobs that are allowed to run far longer than a request.
+        """
+        token = QueryGuard._limits.set((timeout, max_cost))
+        try:
+            yield
+        finally:
+            QueryGuard._limits.reset(token)
+
+    @staticmethod
+    def filter_size(filters_config, depth=1):
+        """
+        Return ``(nodes, depth)`` for a DynamicFilter tree. Every ``and``/
+        ``or``/``not`` operator and every field of an ``eq`` counts as a node.
+        """
+        if isinstance(filters_config, list):
+            sizes = [QueryGuard.filter_size(item, depth) for item in filters_config]
+            return (
+                sum(nodes for nodes, _ in sizes),
+                max([item_depth for _, item_depth in sizes] or [depth]),
+            )
+        if not isinstance(filters_config, dict):
+            return 0, depth
+
+        nodes, max_depth = 0, depth
+        for operator, value in filters_config.items():
+            if operator == 'eq' and isinstance(value, dict):
+                nodes += len(value)
+            else:
+                child_nodes, child_depth = QueryGuard.filter_size(value, depth + 1)
+                nodes += 1 + child_nodes
+                max_depth = max(max_depth, child_depth)
+        return nodes, max_depth
+
+    @staticmethod
+    def check_filters(filters_config):
+        if not filters_config:
+            return 0
+
+        nodes, depth = QueryGuard.filter_size(filters_config)
+        if nodes > QueryGuard.max_filter_nodes():
+            raise QueryBudgetExceeded(
+                f"Filter has {nodes} conditions; at most "
+                f"{QueryGuard.max_filter_nodes()} are allowed.",
+                status_code=400,
+            )
+        if depth > QueryGuard.max_filter_depth():
+            raise QueryBudgetExceeded(
+                f"Filter is nested {depth} levels deep; at most "
+                f"{QueryGuard.max_filter_depth()} are allowed.",
+                status_code=400,
+            )
+        return nodes
+
+    @staticmethod
+    def estimate_cost(queryset, filter_nodes=0):
+        """
+        Estimate the rows a query touches from its ``EXPLAIN QUERY PLAN``.
+
+        Full scans cost the table's row count, index searches and temporary
+        sort b-trees a fraction of it, and every filter condition is
+        evaluated once per scanned row.
+        Only SQLite plans are understood; other backends estimate zero.
+        """
+        db_connection = connections[queryset.db]
+        if db_connection.vendor != 'sqlite':
+            return 0
+
+        cost = 0
+        rows = 0
+        for line in queryset.explain().splitlines():
+            if 'USE TEMP B-TREE' in line:
+                # A sort or distinct pass over the preceding scan's rows.
+                cost += rows // 10
+                continue
+            match = QueryGuard._scan_re.search(line)
+            if not match:
+                continue
+            rows = QueryGuard._table_rows(db_connection, match.group(2))
+            if match.group(1) == 'SCAN':
+                cost += rows
+            else:
+                cost += rows // 10
+        return cost * (1 + filter_nodes)
+
+    @staticmethod
+    def _table_rows(db_connection, table):
+        # MAX(rowid) is answered from the b-tree edge, unlike COUNT(*).
+        with db_connection.cursor() as cursor:
+            try:
+                cursor.execute(f'SELECT MAX(rowid) FROM "{table}"')
+            except OperationalError:
+                return 0
+            row = cursor.fetchone()
+        return (row[0] or 0) if row else 0
+
+    @staticmethod
+    def check_queryset(queryset, filters_config=None):
+        """
+        Reject ``queryset`` before it runs when its estimated cost is over
+        ``ANALYTICS_MAX_QUERY_COST``.
+        """
+        filter_nodes = QueryGuard.check_filters(filters_config)
+        cost = QueryGuard.estimate_cost(queryset, filter_nodes)
+        if cost > QueryGuard.max_query_cost():
+            raise QueryBudgetExceeded(
+                f"Query is too expensive to run inline (estimated cost {cost}); "
+                "narrow the time range, simplify the filters or submit it to /analytics/jobs/.",
+                status_code=422,
+                estimated_cost=cost,
+            )
+        return queryset
+
+    @staticmethod
+    @contextmanager
+    def execution_budget(seconds=None, deadline=None):
+        """
+        Abort any SQLite statement still running ``seconds`` after entry, or
+        after the absolute ``deadline`` (a ``time.monotonic()`` value) when
+        one is handed over from another thread.
+
+        Nested budgets keep the earliest deadline.
+        """
+        if seconds is None:
+            seconds = QueryGuard.query_timeout()
+
+        state = QueryGuard._state
+        outer_deadline = getattr(state, 'deadline', None)
+        if deadline is None:
+            deadline = time.monotonic() + seconds
+        else:
+            seconds = max(deadline - time.monotonic(), 0)
+        if outer_deadline is not None:
+            deadline = min(deadline, outer_deadline)
+        state.deadline = deadline
+
+        try:
+            yield
+        except OperationalError as e:
+            if 'interrupted' in str(e) and time.monotonic() >= deadline:
+                raise QueryBudgetExceeded(
+                    f"Analytics query exceeded its {seconds:g}s execution budget."
+                ) from e
+            raise
+        finally:
+            state.deadline = outer_deadline
+
+    @staticmethod
+    def current_deadline():
+        return getattr(QueryGuard._state, 'deadline', None)
+
+    @staticmethod
+    def _progress_handler():
+        deadline = getattr(QueryGuard._state, 'deadline', None)
+        return int(deadline is not None and time.monotonic() >= deadline)
+
+    @staticmethod
+    def install_progress_handler(sender, connection, **kwargs):
+        """
+        ``connection_created`` receiver. The handler is a no-op unless the
+        current thread is inside an execution budget.
+        """
+        if connection.vendor == 'sqlite':
+            connection.connection.set_progress_handler(
+                QueryGuard._progress_handler, 10000
+            )
+
+
+def budgeted(func):
+    """Run ``func`` under the default analytics execution budget."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with QueryGuard.execution_budget():
+            return func(*args, **kwargs)
+
+    return wrapper
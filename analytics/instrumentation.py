@@ -0,0 +1,25 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('analytics')
+
+_recent = deque(maxlen=200)
+_lock = threading.Lock()
+
+
+def record(event, **fields):
+    """Log an analytics execution event and keep it for ``recent()``."""
+    entry = dict(fields, event=event, at=time.time())
+    with _lock:
+        _recent.append(entry)
+    logger.info("%s %s", event, json.dumps(fields, default=str, sort_keys=True))
+
+
+def recent(event=None):
+    """Most recent events first, optionally only those named ``event``."""
+    with _lock:
+        entries = list(_recent)
+    return [entry for entry in reversed(entries) if event is None or entry['event'] == event]
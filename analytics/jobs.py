@@ -0,0 +1,236 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .guards import QueryGuard
+from .models import AnalyticsJob
+from .routers import replica_reads
+from .serializers import (
+    BlogViewsAnalyticsSerializer, TopAnalyticsSerializer, PerformanceAnalyticsSerializer
+)
+from .services import AnalyticsService
+
+
+def blog_views_response(data, filters_config):
+    if data.get('limit') or data.get('page_size'):
+        response_data = AnalyticsService.get_blog_views_page(
+            object_type=data['object_type'],
+            range_type=data['range'],
+            filters_config=filters_config,
+            limit=data.get('limit'),
+            page_size=data.get('page_size'),
+            cursor=data.get('cursor'),
+        )
+    else:
+        result = AnalyticsService.get_blog_views_analytics(
+            object_type=data['object_type'],
+            range_type=data['range'],
+            filters_config=filters_config,
+            approx=data['mode'] == 'approx',
+        )
+        response_data = {'data': result}
+    if data['mode'] == 'approx':
+        response_data['approx'] = AnalyticsService.sample_info()
+    return response_data
+
+
+def top_response(data, filters_config):
+    result = AnalyticsService.get_top_analytics(
+        top_type=data['top'],
+        filters_config=filters_config,
+        time_range=data.get('time_range'),
+        approx=data['mode'] == 'approx',
+    )
+    response_data = {'data': result}
+    if data['mode'] == 'approx':
+        response_data['approx'] = AnalyticsService.sample_info()
+    return response_data
+
+
+def performance_response(data, filters_config):
+    result = AnalyticsService.get_performance_analytics(
+        compare=data['compare'],
+        user_id=data.get('user_id'),
+        filters_config=filters_config,
+    )
+    return {'data': result}
+
+
+# Analytics request kinds: the serializer validating their parameters and
+# the function building their response.
+ANALYTICS_KINDS = {
+    'blog-views': (BlogViewsAnalyticsSerializer, blog_views_response),
+    'top': (TopAnalyticsSerializer, top_response),
+    'performance': (PerformanceAnalyticsSerializer, performance_response),
+}
+
+
+class JobLimitExceeded(Exception):
+    pass
+
+
+class JobRunner:
+    """
+    Runs analytics requests as background jobs on a local thread pool.
+
+    Jobs live in ``AnalyticsJob``, so their status and results outlive the
+    request and the process. A spec identical to one still queued or
+    running joins that job. A finished result younger than
+    ``ANALYTICS_JOB_RESULT_TTL`` is returned again, to job submitters and to
+    the synchronous endpoints alike.
+    """
+
+    _pool = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def workers():
+        return getattr(settings, 'ANALYTICS_JOB_WORKERS', 2)
+
+    @staticmethod
+    def client_limit():
+        return getattr(settings, 'ANALYTICS_JOB_CLIENT_LIMIT', 2)
+
+    @staticmethod
+    def result_ttl():
+        return getattr(settings, 'ANALYTICS_JOB_RESULT_TTL', 3600)
+
+    @staticmethod
+    def job_timeout():
+        return getattr(settings, 'ANALYTICS_JOB_TIMEOUT', 600.0)
+
+    @staticmethod
+    def job_max_cost():
+        return getattr(settings, 'ANALYTICS_JOB_MAX_QUERY_COST', 5_000_000_000)
+
+    @staticmethod
+    def spec(kind, data, filters_config):
+        # Round-trip through JSON so specs hash the same whether they come
+        # from a serializer or back from the job table.
+        return json.loads(json.dumps(
+            {'kind': kind, 'params': data, 'filters': filters_config},
+            cls=DjangoJSONEncoder, sort_keys=True,
+        ))
+
+    @staticmethod
+    def spec_hash(spec):
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def stored_result(kind, data, filters_config, max_age=None):
+        """
+        The result of a job for this request that finished within
+        ``max_age`` seconds (the result TTL by default), or None.
+        """
+        if max_age is None:
+            max_age = JobRunner.result_ttl()
+        spec_hash = JobRunner.spec_hash(JobRunner.spec(kind, data, filters_config))
+        return (
+            AnalyticsJob.objects
+            .filter(
+                spec_hash=spec_hash,
+                status=AnalyticsJob.DONE,
+                finished_at__gte=timezone.now() - timedelta(seconds=max_age),
+            )
+            .order_by('-finished_at')
+            .values_list('result', flat=True)
+            .first()
+        )
+
+    @staticmethod
+    def submit(kind, data, filters_config, client):
+        """
+        Return ``(job, created)`` for this request. Raises JobLimitExceeded
+        when ``client`` already has ``ANALYTICS_JOB_CLIENT_LIMIT`` unfinished jobs.
+        """
+        spec = JobRunner.spec(kind, data, filters_config)
+        spec_hash = JobRunner.spec_hash(spec)
+        reusable = AnalyticsJob.objects.filter(spec_hash=spec_hash).filter(
+            Q(status__in=[AnalyticsJob.QUEUED, AnalyticsJob.RUNNING])
+            | Q(
+                status=AnalyticsJob.DONE,
+                finished_at__gte=timezone.now() - timedelta(seconds=JobRunner.result_ttl()),
+            )
+        )
+        job = reusable.order_by('-created_at').first()
+        if job is not None:
+            return job, False
+
+        active = AnalyticsJob.objects.filter(
+            client=client, status__in=[AnalyticsJob.QUEUED, AnalyticsJob.RUNNING]
+        ).count()
+        if active >= JobRunner.client_limit():
+            raise JobLimitExceeded(
+                f"{active} jobs are still unfinished for this client; "
+                f"at most {JobRunner.client_limit()} may run at once."
+            )
+
+        try:
+            with transaction.atomic():
+                job = AnalyticsJob.objects.create(
+                    kind=kind, spec=spec, spec_hash=spec_hash, client=client
+                )
+        except IntegrityError:
+            # Someone submitted the same spec in the meantime.
+            return AnalyticsJob.objects.get(
+                spec_hash=spec_hash, status__in=[AnalyticsJob.QUEUED, AnalyticsJob.RUNNING]
+            ), False
+
+        transaction.on_commit(lambda: JobRunner._executor().submit(JobRunner.run, job.pk))
+        return job, True
+
+    @staticmethod
+    def run(job_id):
+        try:
+            # Claiming is atomic, so a job never runs twice.
+            claimed = AnalyticsJob.objects.filter(pk=job_id, status=AnalyticsJob.QUEUED).update(
+                status=AnalyticsJob.RUNNING, started_at=timezone.now()
+            )
+            if not claimed:
+                return
+
+            job = AnalyticsJob.objects.get(pk=job_id)
+            _, build_response = ANALYTICS_KINDS[job.kind]
+            try:
+                with replica_reads(), QueryGuard.limits(JobRunner.job_timeout(), JobRunner.job_max_cost()):
+                    result = build_response(job.spec['params'], job.spec['filters'])
+            except Exception as e:
+                AnalyticsJob.objects.filter(pk=job_id).update(
+                    status=AnalyticsJob.FAILED, error=str(e), finished_at=timezone.now()
+                )
+            else:
+                AnalyticsJob.objects.filter(pk=job_id).update(
+                    status=AnalyticsJob.DONE, result=result, finished_at=timezone.now()
+                )
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def _executor():
+        with JobRunner._lock:
+            if JobRunner._pool is None:
+                JobRunner._pool = ThreadPoolExecutor(
+                    max_workers=JobRunner.workers(), thread_name_prefix='analytics-job'
+                )
+                JobRunner._requeue_orphans(JobRunner._pool)
+            return JobRunner._pool
+
+    @staticmethod
+    def _requeue_orphans(pool):
+        """
+        Pick up jobs left behind by a stopped process: queued ones, and
+        running ones that have overrun twice the job timeout.
+        """
+        stale = timezone.now() - timedelta(seconds=2 * JobRunner.job_timeout())
+        AnalyticsJob.objects.filter(status=AnalyticsJob.RUNNING, started_at__lt=stale).update(
+            status=AnalyticsJob.QUEUED, started_at=None
+        )
+        for job_id in AnalyticsJob.objects.filter(status=AnalyticsJob.QUEUED).values_list('pk', flat=True):
+            pool.submit(JobRunner.run, job_id)
@@ -0,0 +1,242 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from analytics.models import BlogViewSample
+from analytics.services import AnalyticsService
+
+ARCHIVE_FIELDS = ('id', 'blog_id', 'author_id', 'country_id', 'viewed_at', 'hour_bucket', 'count')
+
+# Daily compaction moves rows to the start of their own day, so every total
+# stays exact. Monthly compaction moves a month's views onto its first day:
+# month and year totals stay exact, but day and week totals inside those
+# months change. The defaults stay past the longest rolling ``time_range``
+# window (365 days), so rolling totals are not affected either.
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact old view rows into one row per blog per day or month, "
+        "archive the rows they replace to gzipped JSON lines, optionally "
+        "purge very old history, then reclaim space and refresh statistics. "
+        "Work is done in short transactions so writers are never blocked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--daily-after', type=int,
+            default=getattr(settings, 'ANALYTICS_RETENTION_DAILY_AFTER', 400),
+            help="Compact rows older than this many days into one row per blog per day.",
+        )
+        parser.add_argument(
+            '--monthly-after', type=int,
+            default=getattr(settings, 'ANALYTICS_RETENTION_MONTHLY_AFTER', 800),
+            help="Compact whole months older than this many days into one row per blog per month.",
+        )
+        parser.add_argument(
+            '--purge-after', type=int,
+            default=getattr(settings, 'ANALYTICS_RETENTION_PURGE_AFTER', None),
+            help="Archive and delete rows older than this many days. Their views "
+                 "disappear from analytics. Off by default.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Blogs compacted, or rows purged, per transaction.",
+        )
+        parser.add_argument(
+            '--vacuum-pages', type=int, default=1000,
+            help="Pages freed per incremental vacuum step.",
+        )
+        parser.add_argument('--no-archive', action='store_true', help="Do not keep the replaced rows.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change and stop.")
+
+    def handle(self, *args, **options):
+        if options['daily_after'] < 1 or options['monthly_after'] < options['daily_after']:
+            raise CommandError("Need 1 <= --daily-after <= --monthly-after.")
+        if options['purge_after'] is not None and options['purge_after'] < options['monthly_after']:
+            raise CommandError("--purge-after must not be shorter than --monthly-after.")
+
+        self.options = options
+        self.archive_dir = getattr(
+            settings, 'ANALYTICS_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive')
+        )
+
+        today = timezone.localdate()
+        monthly_end = (today - timedelta(days=options['monthly_after'])).replace(day=1)
+        daily_end = today - timedelta(days=options['daily_after'])
+
+        changed = 0
+        for model, using in AnalyticsService._view_sources():
+            alias = using or router.db_for_write(model)
+            label = f"{model._meta.db_table}@{alias}"
+            rows = model.objects.using(alias)
+
+            purged = 0
+            if options['purge_after'] is not None:
+                purge_end = today - timedelta(days=options['purge_after'])
+                purged = self.purge(rows, alias, purge_end)
+            monthly = self.compact(rows, alias, 'month', None, monthly_end)
+            daily = self.compact(rows, alias, 'day', monthly_end, daily_end)
+
+            self.stdout.write(
+                f"{label}: {monthly[0]} rows -> {monthly[1]} monthly, "
+                f"{daily[0]} rows -> {daily[1]} daily, {purged} purged"
+            )
+            changed += monthly[0] + daily[0] + purged
+            if not options['dry_run']:
+                self.reclaim(alias, model._meta.db_table)
+
+        if options['purge_after'] is not None and not options['dry_run']:
+            # The approximate-mode sample must not outlive the rows it stands for.
+            BlogViewSample.objects.filter(
+                viewed_at__lt=AnalyticsService._day_start(today - timedelta(days=options['purge_after']))
+            ).delete()
+
+        if changed and not options['dry_run']:
+            # Moved and purged views change sealed buckets. The generation is
+            # shared, so web processes drop theirs too, not just this one.
+            AnalyticsService.invalidate_all_buckets()
+        self.stdout.write(self.style.SUCCESS("Retention applied." if not options['dry_run'] else "Dry run, nothing changed."))
+
+    def compact(self, rows, alias, period, start_day, end_day):
+        """
+        Replace every blog's rows in each ``period`` between ``start_day`` and
+        ``end_day`` with one row at the start of the period. Periods and blogs
+        that already have a single row are left alone.
+        """
+        window = rows.filter(viewed_at__lt=AnalyticsService._day_start(end_day))
+        if start_day is not None:
+            window = window.filter(viewed_at__gte=AnalyticsService._day_start(start_day))
+        periods = (
+            window
+            .annotate(period=Trunc('viewed_at', period))
+            .values('period')
+            .annotate(rows=Count('id'), blogs=Count('blog_id', distinct=True))
+            .filter(rows__gt=F('blogs'))
+            .order_by('period')
+            .values_list('period', flat=True)
+        )
+
+        removed = created = 0
+        for period_start in list(periods):
+            period_end = self.period_end(period_start, period)
+            in_period = rows.filter(viewed_at__gte=period_start, viewed_at__lt=period_end)
+            blog_ids = list(
+                in_period.values('blog_id')
+                .annotate(rows=Count('id'))
+                .filter(rows__gt=1)
+                .order_by('blog_id')
+                .values_list('blog_id', flat=True)
+            )
+            for offset in range(0, len(blog_ids), self.options['batch_size']):
+                batch = blog_ids[offset:offset + self.options['batch_size']]
+                if self.options['dry_run']:
+                    removed += in_period.filter(blog_id__in=batch).count()
+                    created += len(batch)
+                    continue
+                with transaction.atomic(using=alias):
+                    old = list(in_period.filter(blog_id__in=batch).values(*ARCHIVE_FIELDS))
+                    self.archive(alias, rows.model, old)
+                    rows.filter(id__in=[row['id'] for row in old]).delete()
+                    rows.bulk_create(self.merge(rows.model, old, period_start))
+                    # BlogView.viewed_at is auto_now_add, which bulk_create
+                    # honours, so put the merged rows back in their period.
+                    rows.filter(blog_id__in=batch, hour_bucket=period_start).update(viewed_at=period_start)
+                removed += len(old)
+                created += len(batch)
+        return removed, created
+
+    def merge(self, model, old, period_start):
+        merged = {}
+        for row in old:
+            entry = merged.setdefault(row['blog_id'], model(
+                blog_id=row['blog_id'],
+                author_id=row['author_id'],
+                country_id=row['country_id'],
+                viewed_at=period_start,
+                hour_bucket=period_start,
+                count=0,
+            ))
+            entry.count += row['count']
+        return list(merged.values())
+
+    def period_end(self, period_start, period):
+        if period == 'day':
+            return period_start + timedelta(days=1)
+        day = timezone.localdate(period_start)
+        next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return AnalyticsService._day_start(next_month)
+
+    def purge(self, rows, alias, end_day):
+        old_rows = rows.filter(viewed_at__lt=AnalyticsService._day_start(end_day))
+        if self.options['dry_run']:
+            return old_rows.count()
+
+        purged = 0
+        while True:
+            with transaction.atomic(using=alias):
+                old = list(old_rows.order_by('id').values(*ARCHIVE_FIELDS)[:self.options['batch_size']])
+                if not old:
+                    break
+                self.archive(alias, rows.model, old)
+                rows.filter(id__in=[row['id'] for row in old]).delete()
+            purged += len(old)
+        return purged
+
+    def archive(self, alias, model, old):
+        """
+        Append ``old`` to one gzipped JSON lines file per table, database and
+        month. Rows are archived before they are deleted, so an interrupted
+        run can leave duplicates in the archive but never loses a row.
+        """
+        if self.options['no_archive'] or not old:
+            return
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        by_month = {}
+        for row in old:
+            by_month.setdefault(timezone.localtime(row['viewed_at']).strftime('%Y-%m'), []).append(row)
+        for month, month_rows in by_month.items():
+            path = os.path.join(self.archive_dir, f"{model._meta.db_table}-{alias}-{month}.jsonl.gz")
+            # Appending adds a new gzip member; readers see one continuous stream.
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for row in month_rows:
+                    f.write(json.dumps(row, default=str) + '\n')
+
+    def reclaim(self, alias, table):
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA auto_vacuum")
+            if cursor.fetchone()[0] == 2:
+                # Small steps, each its own short write transaction.
+                previous = None
+                while True:
+                    cursor.execute("PRAGMA freelist_count")
+                    free = cursor.fetchone()[0]
+                    if not free or free == previous:
+                        break
+                    previous = free
+                    cursor.execute(f"PRAGMA incremental_vacuum({int(self.options['vacuum_pages'])})")
+                    cursor.fetchall()
+            else:
+                cursor.execute("PRAGMA freelist_count")
+                free = cursor.fetchone()[0]
+                if free:
+                    self.stdout.write(
+                        f"{alias}: {free} free pages are reused but not returned to the OS; "
+                        f"run 'PRAGMA auto_vacuum = INCREMENTAL; VACUUM;' once during "
+                        f"maintenance to let later runs shrink the file in small steps."
+                    )
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, OuterRef, Q, Subquery
+from analytics.models import Blog, BlogView
+from analytics.services import AnalyticsService
+
+
+class Command(BaseCommand):
+    help = "Fill BlogView.author and BlogView.country from each row's blog."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Rows updated per statement, so no single write holds the lock for long.",
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Rewrite every row instead of only rows with missing values.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        blogs = Blog.objects.filter(pk=OuterRef('blog_id'))
+        last_id = BlogView.objects.aggregate(last=Max('id'))['last'] or 0
+
+        total = 0
+        for start in range(0, last_id, batch_size):
+            rows = BlogView.objects.filter(id__gt=start, id__lte=start + batch_size)
+            if not options['all']:
+                rows = rows.filter(Q(author__isnull=True) | Q(country__isnull=True))
+            total += rows.update(
+                author_id=Subquery(blogs.values('author_id')[:1]),
+                country_id=Subquery(blogs.values('author__country_id')[:1]),
+            )
+
+        if total:
+            AnalyticsService.invalidate_all_buckets()
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} blog view rows."))
@@ -0,0 +1,157 @@
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from analytics.models import Blog, BlogView, BlogViewSample
+from analytics.routers import view_shards
+from analytics.sampling import ViewSampler
+from analytics.services import AnalyticsService
+
+QUERIES = [
+    ('blog-views country/year', lambda approx: AnalyticsService.get_blog_views_analytics('country', 'year', None, approx=approx)),
+    ('blog-views user/month', lambda approx: AnalyticsService.get_blog_views_analytics('user', 'month', None, approx=approx)),
+    ('top blog', lambda approx: AnalyticsService.get_top_analytics('blog', None, 'last_year', approx=approx)),
+    ('top user', lambda approx: AnalyticsService.get_top_analytics('user', None, 'last_year', approx=approx)),
+    ('top country filtered', lambda approx: AnalyticsService.get_top_analytics(
+        'country', {"not": {"eq": {"blog__title__icontains": "React"}}}, 'last_year', approx=approx
+    )),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare mode=approx against exact analytics on synthetic data of "
+        "several sizes: latency, speedup, relative error of the view totals "
+        "and how often the confidence interval covers the exact value. "
+        "Synthetic rows are added inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help="Comma-separated counts of synthetic hourly rows; rows landing on the same blog and hour merge.")
+        parser.add_argument('--rate', type=float, default=None, help="Sample rate; defaults to ANALYTICS_SAMPLE_RATE.")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per query; the median is reported.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if view_shards():
+            raise CommandError("The benchmark writes synthetic rows to BlogView; run it without view shards.")
+        self.blogs = list(Blog.objects.values_list('id', 'author_id', 'author__country_id'))
+        if not self.blogs:
+            raise CommandError("No blogs to attach synthetic views to; seed data first.")
+
+        rate = options['rate'] if options['rate'] is not None else ViewSampler.rate()
+        if not rate:
+            raise CommandError("Sampling is off; pass --rate or set ANALYTICS_SAMPLE_RATE.")
+        self.repeat = options['repeat']
+        self.random = random.Random(options['seed'])
+
+        report = []
+        with override_settings(ANALYTICS_SAMPLE_RATE=rate):
+            for size in [int(size) for size in options['sizes'].split(',')]:
+                with transaction.atomic():
+                    self.insert_views(size)
+                    ViewSampler.rebuild([BlogView.objects.all()], seed=options['seed'])
+                    report.append(self.measure(size, rate))
+                    transaction.set_rollback(True)
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def insert_views(self, size):
+        """``size`` hourly rows over the last year with skewed per-blog popularity."""
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        hours = 365 * 24
+        weights = [1 / (rank + 1) for rank in range(len(self.blogs))]
+        ops = connection.ops
+        table = ops.quote_name(BlogView._meta.db_table)
+        sql = (
+            f"INSERT INTO {table} (blog_id, author_id, country_id, viewed_at, count, hour_bucket) "
+            f"VALUES (%s, %s, %s, %s, %s, %s) "
+            f"ON CONFLICT (blog_id, hour_bucket) DO UPDATE SET count = {table}.count + excluded.count"
+        )
+        rows = []
+        for blog_id, author_id, country_id in self.random.choices(self.blogs, weights, k=size):
+            bucket = ops.adapt_datetimefield_value(now - timedelta(hours=self.random.randrange(1, hours)))
+            count = int(self.random.paretovariate(1.5))
+            rows.append([blog_id, author_id, country_id, bucket, count, bucket])
+        with connection.cursor() as cursor:
+            for offset in range(0, len(rows), 5000):
+                cursor.executemany(sql, rows[offset:offset + 5000])
+
+    def timed(self, run):
+        durations = []
+        for _ in range(self.repeat):
+            cache.clear()
+            started = time.perf_counter()
+            result = run()
+            durations.append(time.perf_counter() - started)
+        return result, statistics.median(durations)
+
+    def measure(self, size, rate):
+        result = {
+            'synthetic_rows': size,
+            'view_rows': BlogView.objects.count(),
+            'sample_rows': BlogViewSample.objects.count(),
+            'sample_rate': rate,
+            'queries': {},
+        }
+        for name, run in QUERIES:
+            exact, exact_seconds = self.timed(lambda: run(False))
+            approx, approx_seconds = self.timed(lambda: run(True))
+            errors, covered = self.compare(exact, approx)
+            result['queries'][name] = {
+                'exact_ms': round(exact_seconds * 1000, 2),
+                'approx_ms': round(approx_seconds * 1000, 2),
+                'speedup': round(exact_seconds / approx_seconds, 1) if approx_seconds else None,
+                'median_error': round(statistics.median(errors), 4) if errors else None,
+                'max_error': round(max(errors), 4) if errors else None,
+                'ci_coverage': round(covered / len(errors), 3) if errors else None,
+            }
+        return result
+
+    def compare(self, exact, approx):
+        """Relative error of ``z`` and CI hits, for entries present in both results."""
+        def keyed(rows):
+            seen = {}
+            keys = {}
+            for row in rows:
+                # blog-views repeats a label once per period, in period order.
+                seen[row['x']] = seen.get(row['x'], 0) + 1
+                keys[(row['x'], seen[row['x']])] = row
+            return keys
+
+        exact_rows, approx_rows = keyed(exact), keyed(approx)
+        errors = []
+        covered = 0
+        for key, row in exact_rows.items():
+            estimate = approx_rows.get(key)
+            if estimate is None or not row['z']:
+                continue
+            errors.append(abs(estimate['z'] - row['z']) / row['z'])
+            low, high = estimate['z_ci']
+            covered += low <= row['z'] <= high
+        return errors, covered
+
+    def print_report(self, report):
+        header = f"{'rows':>9}{'sample':>8}  {'query':<24}{'exact ms':>10}{'approx ms':>11}{'speedup':>9}{'med err':>9}{'max err':>9}{'CI cov':>8}"
+        self.stdout.write(self.style.MIGRATE_HEADING(header))
+        for result in report:
+            for name, stats in result['queries'].items():
+                self.stdout.write(
+                    f"{result['view_rows']:>9}{result['sample_rows']:>8}  {name:<24}"
+                    f"{stats['exact_ms']:>10}{stats['approx_ms']:>11}{stats['speedup'] or '-':>9}"
+                    f"{stats['median_error'] if stats['median_error'] is not None else '-':>9}"
+                    f"{stats['max_error'] if stats['max_error'] is not None else '-':>9}"
+                    f"{stats['ci_coverage'] if stats['ci_coverage'] is not None else '-':>8}"
+                )
@@ -0,0 +1,116 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from analytics.fieldsets import SparseFields
+from analytics.models import Blog, BlogView, User
+from analytics.serializers import BlogSerializer, BlogViewSerializer, UserSerializer
+
+ENDPOINTS = [
+    ('users', UserSerializer, lambda: User.objects.select_related('country').all(), 'id,username'),
+    ('blogs', BlogSerializer, lambda: Blog.objects.select_related('author', 'author__country').all(), 'id,title,author_name'),
+    ('blog-views', BlogViewSerializer, lambda: BlogView.objects.select_related('blog', 'blog__author').all(), 'id,count'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the list serializers against the values() fast path, with "
+        "all fields and with a sparse ?fields= set: rows per second and peak "
+        "memory per endpoint. Synthetic view rows are added inside a "
+        "transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help="Synthetic BlogView rows to add for the run.")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per path; the median is reported.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        blogs = list(Blog.objects.values_list('id', 'author_id', 'author__country_id'))
+        if not blogs:
+            raise CommandError("No blogs to attach synthetic views to; seed data first.")
+        self.repeat = options['repeat']
+
+        report = []
+        with transaction.atomic():
+            self.insert_views(blogs, options['rows'], random.Random(options['seed']))
+            for name, serializer_class, queryset, sparse in ENDPOINTS:
+                report.append(self.measure(name, serializer_class, queryset, sparse.split(',')))
+            transaction.set_rollback(True)
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def insert_views(self, blogs, size, rng):
+        now = timezone.now()
+        ops = connection.ops
+        table = ops.quote_name(BlogView._meta.db_table)
+        sql = (
+            f"INSERT INTO {table} (blog_id, author_id, country_id, viewed_at, count, hour_bucket) "
+            f"VALUES (%s, %s, %s, %s, %s, NULL)"
+        )
+        rows = [
+            [blog_id, author_id, country_id,
+             ops.adapt_datetimefield_value(now - timedelta(seconds=rng.randrange(365 * 86400))),
+             rng.randrange(1, 50)]
+            for blog_id, author_id, country_id in (rng.choice(blogs) for _ in range(size))
+        ]
+        with connection.cursor() as cursor:
+            for offset in range(0, len(rows), 5000):
+                cursor.executemany(sql, rows[offset:offset + 5000])
+
+    def measure(self, name, serializer_class, queryset, sparse):
+        fields = serializer_class().fields
+        paths = {
+            'serializer': lambda: serializer_class(queryset(), many=True).data,
+            'values': lambda: self.values(queryset(), SparseFields.columns(fields)),
+            'values sparse': lambda: self.values(queryset(), SparseFields.columns(fields, sparse)),
+        }
+        result = {'endpoint': name, 'sparse_fields': sparse, 'paths': {}}
+        for path, run in paths.items():
+            rows, seconds, peak = self.timed(run)
+            result['paths'][path] = {
+                'rows': rows,
+                'ms': round(seconds * 1000, 2),
+                'rows_per_sec': round(rows / seconds) if seconds else None,
+                'peak_kib': round(peak / 1024, 1),
+            }
+        return result
+
+    @staticmethod
+    def values(queryset, columns):
+        return SparseFields.rows(queryset.values(*[column for _, column, _ in columns]), columns)
+
+    def timed(self, run):
+        durations = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            rows = len(run())
+            durations.append(time.perf_counter() - started)
+        # Measured on a separate run; tracing slows everything down.
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return rows, statistics.median(durations), peak
+
+    def print_report(self, report):
+        header = f"{'endpoint':<12}{'path':<16}{'rows':>8}{'ms':>10}{'rows/s':>11}{'peak KiB':>11}"
+        self.stdout.write(self.style.MIGRATE_HEADING(header))
+        for result in report:
+            for path, stats in result['paths'].items():
+                self.stdout.write(
+                    f"{result['endpoint']:<12}{path:<16}{stats['rows']:>8}{stats['ms']:>10}"
+                    f"{stats['rows_per_sec'] or '-':>11}{stats['peak_kib']:>11}"
+                )
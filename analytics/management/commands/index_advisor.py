@@ -0,0 +1,372 @@
+import json
+import re
+import sqlite3
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from analytics.models import BlogView, User
+from analytics.services import AnalyticsService
+
+COMMON_FILTERS = [
+    None,
+    {"eq": {"blog__author__country__name": "United States"}},
+    {"eq": {"blog__author__username": "john_doe"}},
+    {"not": {"eq": {"blog__title__icontains": "React"}}},
+    {"and": [
+        {"eq": {"blog__author__country__name": "Canada"}},
+        {"eq": {"blog__title__icontains": "Python"}},
+    ]},
+]
+
+INDEX_USE_RE = re.compile(r'USING (COVERING )?INDEX (\w+)')
+FULL_SCAN_RE = re.compile(r'\bSCAN (\w+)\s*$')
+TEMP_BTREE_RE = re.compile(r'USE TEMP B-TREE FOR (.+)$')
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay AnalyticsService query shapes through EXPLAIN QUERY PLAN and "
+        "report used, unused, duplicate and missing covering indexes, plus "
+        "the write cost of each BlogView index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filters', action='append', default=[],
+            help="Extra filter config (JSON) to replay; may be repeated.",
+        )
+        parser.add_argument(
+            '--rows', type=int, default=20000,
+            help="Rows inserted (and then updated) by the synthetic write workload.",
+        )
+        parser.add_argument(
+            '--skip-write-cost', action='store_true',
+            help="Only analyse query plans.",
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help="Print the report as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("index_advisor only understands SQLite query plans.")
+
+        filters = list(COMMON_FILTERS)
+        for raw in options['filters']:
+            try:
+                filters.append(json.loads(raw))
+            except json.JSONDecodeError as e:
+                raise CommandError(f"Invalid --filters JSON: {e}")
+
+        tables = [model._meta.db_table for model in apps.get_app_config('analytics').get_models()]
+        indexes = self.collect_indexes(tables)
+        queries = self.capture_queries(filters)
+        plans = [self.explain(sql, params) for sql, params in queries]
+
+        report = {
+            'queries': len(queries),
+            'indexes': self.classify_indexes(indexes, plans),
+            'duplicates': self.find_duplicates(indexes),
+            'missing': self.suggest_covering(indexes, queries, plans),
+            'temp_sorts': self.count_temp_sorts(plans),
+        }
+        if not options['skip_write_cost']:
+            report['write_cost'] = self.measure_write_cost(options['rows'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def capture_queries(self, filters):
+        """Run every AnalyticsService shape and record the SQL it issues."""
+        captured = []
+
+        def capture(execute, sql, params, many, context):
+            statement = sql.lstrip().upper()
+            # Skip the guard's own EXPLAIN and row-count probes.
+            if statement.startswith('SELECT') and 'MAX(ROWID)' not in statement:
+                captured.append((sql, tuple(params or ())))
+            return execute(sql, params, many, context)
+
+        user_id = User.objects.values_list('id', flat=True).first()
+
+        # Force sealed buckets to be recomputed so their queries are seen.
+        AnalyticsService.invalidate_all_buckets()
+        with connection.execute_wrapper(capture):
+            for filters_config in filters:
+                for object_type in ('country', 'user'):
+                    for range_type in ('week', 'month', 'year'):
+                        AnalyticsService.get_blog_views_analytics(
+                            object_type, range_type, filters_config
+                        )
+                for top_type in ('blog', 'user', 'country'):
+                    for time_range in (None, 'last_30_days'):
+                        AnalyticsService.get_top_analytics(
+                            top_type, filters_config, time_range
+                        )
+                for compare in ('day', 'week', 'month', 'year'):
+                    for user in (None, user_id):
+                        AnalyticsService.get_performance_analytics(
+                            compare, user, filters_config
+                        )
+
+        unique = {}
+        for sql, params in captured:
+            unique.setdefault(sql, params)
+        return list(unique.items())
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def collect_indexes(self, tables):
+        indexes = {}
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f'PRAGMA index_list("{table}")')
+                for row in cursor.fetchall():
+                    name, unique, origin = row[1], row[2], row[3]
+                    cursor.execute(f'PRAGMA index_info("{name}")')
+                    columns = [info[2] for info in cursor.fetchall()]
+                    indexes[name] = {
+                        'table': table,
+                        'columns': columns,
+                        'unique': bool(unique),
+                        'origin': origin,
+                    }
+        return indexes
+
+    def classify_indexes(self, indexes, plans):
+        uses = {}
+        for plan in plans:
+            for line in plan:
+                for match in INDEX_USE_RE.finditer(line):
+                    uses[match.group(2)] = uses.get(match.group(2), 0) + 1
+
+        result = []
+        for name, info in sorted(indexes.items()):
+            result.append({
+                'name': name,
+                'table': info['table'],
+                'columns': info['columns'],
+                'plans_using': uses.get(name, 0),
+                # Unique and primary key indexes enforce constraints, so they
+                # are never candidates for removal.
+                'enforces_constraint': info['unique'] or info['origin'] in ('u', 'pk'),
+            })
+        return result
+
+    def find_duplicates(self, indexes):
+        """
+        An index is redundant when another index on the same table has the
+        same leading columns, so it can answer every lookup this one can.
+        """
+        findings = []
+        items = sorted(indexes.items())
+        for name, info in items:
+            if info['unique']:
+                continue
+            for other, other_info in items:
+                if other == name or other_info['table'] != info['table']:
+                    continue
+                columns, other_columns = info['columns'], other_info['columns']
+                if other_columns[:len(columns)] != columns:
+                    continue
+                if columns == other_columns and other > name and not other_info['unique']:
+                    # Report identical pairs once.
+                    continue
+                findings.append({
+                    'index': name,
+                    'covered_by': other,
+                    'reason': 'identical columns' if columns == other_columns else 'prefix of wider index',
+                })
+                break
+        return findings
+
+    def suggest_covering(self, indexes, queries, plans):
+        """
+        Flag full table scans and index lookups that still have to visit the
+        table, with the columns a covering index for them needs. Suggestions
+        that are a prefix of a wider one are folded into it.
+        """
+        suggestions = {}
+        for (sql, _), plan in zip(queries, plans):
+            for line in plan:
+                match = INDEX_USE_RE.search(line)
+                scan = FULL_SCAN_RE.search(line)
+                if match and not match.group(1) and match.group(2) in indexes:
+                    index = indexes[match.group(2)]
+                    table, prefix = index['table'], index['columns']
+                    reason = f"{match.group(2)} is not covering"
+                elif scan:
+                    table, prefix, reason = scan.group(1), [], 'full table scan'
+                else:
+                    continue
+
+                referenced = re.findall(rf'"{table}"\."(\w+)"', sql)
+                columns = tuple(dict.fromkeys(prefix + referenced))
+                entry = suggestions.setdefault((table, columns), {
+                    'table': table,
+                    'columns': list(columns),
+                    'reasons': set(),
+                    'queries': 0,
+                })
+                entry['reasons'].add(reason)
+                entry['queries'] += 1
+
+        for key, entry in list(suggestions.items()):
+            table, columns = key
+            wider = next(
+                (
+                    other for other in suggestions
+                    if other != key and other[0] == table
+                    and other[1][:len(columns)] == columns
+                ),
+                None,
+            )
+            if wider is not None:
+                suggestions[wider]['reasons'] |= entry['reasons']
+                suggestions[wider]['queries'] += entry['queries']
+                del suggestions[key]
+
+        existing = {(info['table'], tuple(info['columns'])) for info in indexes.values()}
+        return [
+            dict(entry, reasons=sorted(entry['reasons']))
+            for key, entry in sorted(suggestions.items())
+            if key not in existing and entry['columns']
+        ]
+
+    def count_temp_sorts(self, plans):
+        sorts = {}
+        for plan in plans:
+            for line in plan:
+                match = TEMP_BTREE_RE.search(line)
+                if match:
+                    sorts[match.group(1).lower()] = sorts.get(match.group(1).lower(), 0) + 1
+        return sorts
+
+    def measure_write_cost(self, rows):
+        """
+        Time a synthetic insert + increment workload on an in-memory copy of
+        the BlogView table, once bare and once per secondary index.
+        """
+        table = BlogView._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [table]
+            )
+            create_table = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL", [table]
+            )
+            index_sql = dict(cursor.fetchall())
+
+        # Inline UNIQUE constraints become autoindexes; strip them so the
+        # baseline only pays for the table itself.
+        bare_table = re.sub(r',\s*CONSTRAINT "\w+" UNIQUE \([^)]*\)', '', create_table)
+        unique_sql = re.findall(r'CONSTRAINT "(\w+)" UNIQUE \(([^)]*)\)', create_table)
+        for name, columns in unique_sql:
+            index_sql[name] = f'CREATE UNIQUE INDEX "{name}" ON "{table}" ({columns})'
+
+        baseline = self.run_write_workload(bare_table, [], rows)
+        results = {'baseline_us_per_write': round(baseline, 2), 'indexes': []}
+        for name, sql in sorted(index_sql.items()):
+            cost = self.run_write_workload(bare_table, [sql], rows)
+            results['indexes'].append({
+                'name': name,
+                'us_per_write': round(cost, 2),
+                'overhead_us_per_write': round(cost - baseline, 2),
+            })
+        results['all_indexes_us_per_write'] = round(
+            self.run_write_workload(bare_table, list(index_sql.values()), rows), 2
+        )
+        return results
+
+    def run_write_workload(self, create_table, index_sql, rows):
+        db = sqlite3.connect(':memory:')
+        try:
+            db.execute(create_table)
+            for sql in index_sql:
+                db.execute(sql)
+            table = BlogView._meta.db_table
+            blogs = max(rows // 50, 1)
+
+            start = time.perf_counter()
+            with db:
+                db.executemany(
+                    f'INSERT INTO "{table}" '
+                    f'(blog_id, author_id, country_id, viewed_at, count, hour_bucket) '
+                    f'VALUES (?, ?, ?, ?, 1, ?)',
+                    (
+                        (
+                            i % blogs,
+                            i % blogs % 97,
+                            i % blogs % 7,
+                            f'2025-01-01 {i % 24:02d}:00:00.{i:06d}',
+                            f'2025-{1 + i // (blogs * 24) % 12:02d}-01 {i // blogs % 24:02d}:00:00',
+                        )
+                        for i in range(rows)
+                    ),
+                )
+            with db:
+                db.executemany(
+                    f'UPDATE "{table}" SET count = count + 1, viewed_at = ? WHERE id = ?',
+                    ((f'2025-06-01 00:00:00.{i:06d}', i + 1) for i in range(rows)),
+                )
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+        return elapsed / (rows * 2) * 1_000_000
+
+    def print_report(self, report):
+        self.stdout.write(f"Replayed {report['queries']} distinct queries.\n")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Index usage"))
+        for index in report['indexes']:
+            note = " (constraint)" if index['enforces_constraint'] else ""
+            status = f"used by {index['plans_using']} plans" if index['plans_using'] else "UNUSED"
+            self.stdout.write(
+                f"  {index['table']}.{index['name']} ({', '.join(index['columns'])}): {status}{note}"
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Duplicate / redundant indexes"))
+        for finding in report['duplicates']:
+            self.stdout.write(
+                f"  {finding['index']} -> {finding['covered_by']} ({finding['reason']})"
+            )
+        if not report['duplicates']:
+            self.stdout.write("  none")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Missing covering indexes"))
+        for suggestion in report['missing']:
+            self.stdout.write(
+                f"  {suggestion['table']} ({', '.join(suggestion['columns'])}) "
+                f"- {suggestion['queries']} plans: {'; '.join(suggestion['reasons'])}"
+            )
+
+        if not report['missing']:
+            self.stdout.write("  none")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Temp b-trees (sorts not served by an index)"))
+        for purpose, count in sorted(report['temp_sorts'].items()):
+            self.stdout.write(f"  {purpose}: {count} plans")
+        if not report['temp_sorts']:
+            self.stdout.write("  none")
+
+        if 'write_cost' in report:
+            write_cost = report['write_cost']
+            self.stdout.write(self.style.MIGRATE_HEADING("Write cost per BlogView index"))
+            self.stdout.write(f"  baseline: {write_cost['baseline_us_per_write']} us/write")
+            for index in sorted(write_cost['indexes'], key=lambda i: -i['overhead_us_per_write']):
+                self.stdout.write(
+                    f"  {index['name']}: +{index['overhead_us_per_write']} us/write"
+                )
+            self.stdout.write(
+                f"  all indexes: {write_cost['all_indexes_us_per_write']} us/write"
+            )
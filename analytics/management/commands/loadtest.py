@@ -0,0 +1,292 @@
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, OperationalError
+from django.test import Client
+from analytics.models import Blog, User
+
+FILTERS = [
+    None,
+    {"eq": {"blog__author__country__name": "United States"}},
+    {"eq": {"blog__author__username": "john_doe"}},
+    {"not": {"eq": {"blog__title__icontains": "React"}}},
+    {"or": [
+        {"eq": {"blog__author__country__name": "Canada"}},
+        {"eq": {"blog__author__country__name": "Germany"}},
+    ]},
+]
+
+# Statements slower than this are counted as having waited on a lock.
+SLOW_WRITE_SECONDS = 0.05
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile: the smallest value with ``pct``% of values at or below it."""
+    if not sorted_values:
+        return None
+    # pct * n / 100 rather than pct / 100 * n, which is 19.000000000000004 for p95 of 20.
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct * len(sorted_values) / 100) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a mix of view recording, analytics and list requests at a "
+        "target rate or concurrency and report throughput, latency "
+        "percentiles, errors and lock waits per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help="Base URL of a running server, e.g. http://127.0.0.1:8000. "
+                 "Without it requests go through the in-process test client.",
+        )
+        parser.add_argument(
+            '--mix', default='record=3,analytics=5,list=2',
+            help="Relative weights of the record, analytics and list request kinds.",
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help="Target requests/second across all workers; 0 runs closed-loop.",
+        )
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run.")
+        parser.add_argument('--requests', type=int, default=0, help="Stop after this many requests.")
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        self.mix = self.parse_mix(options['mix'])
+        self.random = random.Random(options['seed'])
+        self.base_url = (options['url'] or '').rstrip('/')
+
+        self.blog_ids = list(Blog.objects.values_list('id', flat=True))
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+        if not self.blog_ids:
+            raise CommandError("No blogs to load test against; seed data first.")
+
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.local = threading.local()
+
+        rate = options['rate']
+        limit = options['requests']
+        deadline = time.monotonic() + options['duration']
+        self.issued = 0
+        self.start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for _ in range(options['concurrency']):
+                pool.submit(self.worker, rate, limit, deadline)
+
+        elapsed = time.monotonic() - self.start
+        report = self.build_report(options, elapsed)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def parse_mix(self, raw):
+        mix = {}
+        for part in raw.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in ('record', 'analytics', 'list'):
+                raise CommandError(f"Unknown request kind in --mix: {name!r}")
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f"Invalid weight in --mix: {part!r}")
+        if not any(mix.values()):
+            raise CommandError("--mix needs at least one positive weight.")
+        return mix
+
+    def worker(self, rate, limit, deadline):
+        try:
+            client = None if self.base_url else Client(SERVER_NAME='localhost')
+            with connection.execute_wrapper(self.track_statement):
+                while True:
+                    with self.lock:
+                        if limit and self.issued >= limit:
+                            return
+                        slot = self.issued
+                        self.issued += 1
+                        kind = self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+                        endpoint, method, path = self.build_request(kind)
+
+                    scheduled = time.monotonic()
+                    if rate:
+                        # Open loop: latency counts from the scheduled start,
+                        # so a stalled server is not hidden by waiting workers.
+                        scheduled = self.start + slot / rate
+                        delay = scheduled - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    if time.monotonic() >= deadline:
+                        return
+
+                    self.local.endpoint = endpoint
+                    status, locked = self.send(client, method, path)
+                    self.record(endpoint, time.monotonic() - scheduled, status, locked)
+        finally:
+            connections.close_all()
+
+    def build_request(self, kind):
+        rnd = self.random
+        if kind == 'record':
+            return 'record_view', 'POST', f"/api/blogs/{rnd.choice(self.blog_ids)}/record_view/"
+
+        if kind == 'list':
+            choice = rnd.randrange(3)
+            if choice == 0:
+                return 'blogs', 'GET', '/api/blogs/'
+            if choice == 1:
+                return 'blog-views', 'GET', f"/api/blog-views/?blog={rnd.choice(self.blog_ids)}"
+            return 'users', 'GET', '/api/users/'
+
+        params = {}
+        filters = rnd.choice(FILTERS)
+        if filters:
+            params['filters'] = json.dumps(filters)
+        choice = rnd.randrange(3)
+        if choice == 0:
+            params.update(object_type=rnd.choice(['country', 'user']), range=rnd.choice(['week', 'month', 'year']))
+            endpoint, path = 'analytics/blog-views', '/api/analytics/blog-views/'
+        elif choice == 1:
+            params.update(top=rnd.choice(['blog', 'user', 'country']))
+            if rnd.random() < 0.5:
+                params['time_range'] = rnd.choice(['last_7_days', 'last_30_days', 'last_year'])
+            endpoint, path = 'analytics/top', '/api/analytics/top/'
+        else:
+            params.update(compare=rnd.choice(['day', 'week', 'month', 'year']))
+            if self.user_ids and rnd.random() < 0.3:
+                params['user_id'] = rnd.choice(self.user_ids)
+            endpoint, path = 'analytics/performance', '/api/analytics/performance/'
+        return endpoint, 'GET', f"{path}?{urlencode(params)}"
+
+    def send(self, client, method, path):
+        """Return ``(status, locked)``; status 0 means the request failed to complete."""
+        if client is not None:
+            try:
+                if method == 'POST':
+                    response = client.post(path)
+                else:
+                    response = client.get(path)
+            except OperationalError as e:
+                return 0, 'locked' in str(e)
+            return response.status_code, b'database is locked' in response.content
+
+        request = urllib.request.Request(self.base_url + path, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                body = response.read()
+                return response.status, b'database is locked' in body
+        except urllib.error.HTTPError as e:
+            return e.code, b'database is locked' in e.read()
+        except (urllib.error.URLError, OSError):
+            return 0, False
+
+    def track_statement(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if 'locked' in str(e):
+                self.count(getattr(self.local, 'endpoint', 'unknown'), 'locked_errors')
+            raise
+        finally:
+            is_write = not sql.lstrip().upper().startswith(('SELECT', 'EXPLAIN'))
+            if is_write and time.monotonic() - started >= SLOW_WRITE_SECONDS:
+                self.count(getattr(self.local, 'endpoint', 'unknown'), 'slow_writes')
+
+    def stats_for(self, endpoint):
+        return self.samples.setdefault(endpoint, {
+            'latencies': [],
+            'statuses': {},
+            'errors': 0,
+            'locked_errors': 0,
+            'locked_responses': 0,
+            'slow_writes': 0,
+        })
+
+    def count(self, endpoint, field):
+        with self.lock:
+            self.stats_for(endpoint)[field] += 1
+
+    def record(self, endpoint, latency, status, locked):
+        with self.lock:
+            stats = self.stats_for(endpoint)
+            stats['latencies'].append(latency)
+            stats['statuses'][str(status)] = stats['statuses'].get(str(status), 0) + 1
+            if status == 0 or status >= 500:
+                stats['errors'] += 1
+            if locked:
+                stats['locked_responses'] += 1
+
+    def build_report(self, options, elapsed):
+        endpoints = {}
+        total = errors = 0
+        for endpoint, stats in sorted(self.samples.items()):
+            latencies = sorted(stats['latencies'])
+            total += len(latencies)
+            errors += stats['errors']
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+                'error_rate': round(stats['errors'] / len(latencies), 4) if latencies else None,
+                'statuses': stats['statuses'],
+                'latency_ms': {
+                    name: round(value * 1000, 2) if value is not None else None
+                    for name, value in (
+                        ('p50', percentile(latencies, 50)),
+                        ('p95', percentile(latencies, 95)),
+                        ('p99', percentile(latencies, 99)),
+                        ('max', latencies[-1] if latencies else None),
+                        ('mean', sum(latencies) / len(latencies) if latencies else None),
+                    )
+                },
+                'lock_waits': {
+                    'locked_errors': stats['locked_errors'],
+                    'locked_responses': stats['locked_responses'],
+                    'slow_writes': stats['slow_writes'],
+                },
+            }
+
+        return {
+            'target': self.base_url or 'test-client',
+            'mix': self.mix,
+            'concurrency': options['concurrency'],
+            'rate': options['rate'] or None,
+            'elapsed_seconds': round(elapsed, 3),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+            'error_rate': round(errors / total, 4) if total else None,
+            'endpoints': endpoints,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['requests']} requests in {report['elapsed_seconds']}s "
+            f"({report['throughput_rps']} req/s), error rate {report['error_rate']}"
+        )
+        header = f"{'endpoint':<24}{'reqs':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}{'locks':>7}"
+        self.stdout.write(self.style.MIGRATE_HEADING(header))
+        for endpoint, stats in report['endpoints'].items():
+            latency = stats['latency_ms']
+            locks = sum(stats['lock_waits'].values())
+            errors = round((stats['error_rate'] or 0) * stats['requests'])
+            self.stdout.write(
+                f"{endpoint:<24}{stats['requests']:>7}{stats['throughput_rps']:>9}"
+                f"{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}"
+                f"{errors:>8}{locks:>7}"
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from analytics.sampling import ViewSampler
+from analytics.services import AnalyticsService
+
+
+class Command(BaseCommand):
+    help = (
+        "Redraw the approximate-mode sample from every stored view at "
+        "ANALYTICS_SAMPLE_RATE. Recording keeps the sample current afterwards, "
+        "so this is only needed once, or after changing the rate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="View rows read per batch; each batch is written in its own transaction.",
+        )
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        sources = [
+            AnalyticsService._views(model, using, AnalyticsService._view_filter_q(None))
+            for model, using in AnalyticsService._view_sources()
+        ]
+        read, sampled = ViewSampler.rebuild(sources, options['batch_size'], options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Sampled {sampled} rows from {read} view rows at rate {ViewSampler.rate()}."
+        ))
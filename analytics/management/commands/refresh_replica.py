@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from analytics.models import ReplicaHeartbeat
+from analytics.routers import read_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Stamp the replication heartbeat on the primary and refresh every "
+        "SQLite replica in ANALYTICS_READ_REPLICAS with a snapshot taken "
+        "through the SQLite backup API. Other replicas only need the "
+        "heartbeat; their own replication carries it over."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help="Keep refreshing every this many seconds; 0 refreshes once.",
+        )
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help="Pages copied per backup step, so writers are only paused briefly.",
+        )
+
+    def handle(self, *args, **options):
+        if not read_replicas():
+            raise CommandError("ANALYTICS_READ_REPLICAS is empty; set ANALYTICS_REPLICA_COUNT=N.")
+
+        while True:
+            started = time.monotonic()
+            self.refresh(options['pages'])
+            if not options['interval']:
+                return
+            time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+
+    def refresh(self, pages):
+        # Stamped before copying: everything committed up to the heartbeat
+        # is in the snapshot.
+        beat_at = timezone.now()
+        ReplicaHeartbeat.objects.using('default').update_or_create(pk=1, defaults={'beat_at': beat_at})
+
+        primary = connections['default'].settings_dict
+        for alias in read_replicas():
+            replica = connections[alias].settings_dict
+            if replica['ENGINE'] != 'django.db.backends.sqlite3' or primary['ENGINE'] != replica['ENGINE']:
+                continue
+
+            # Copy into a temporary file and swap it in, so readers see either
+            # the old snapshot or the new one, never a partial copy.
+            target = str(replica['NAME'])
+            partial = f"{target}.partial"
+            source = sqlite3.connect(str(primary['NAME']))
+            destination = sqlite3.connect(partial)
+            try:
+                source.backup(destination, pages=pages)
+            finally:
+                destination.close()
+                source.close()
+            connections[alias].close()
+            os.replace(partial, target)
+            self.stdout.write(f"{alias}: snapshot as of {beat_at.isoformat()}")
@@ -0,0 +1,68 @@
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from .routers import read_replicas, replica_reads
+
+WRITE_COOKIE = 'analytics_last_write'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WROTE_ATTR = 'analytics_wrote'
+
+
+def _last_write(request):
+    try:
+        return float(request.COOKIES.get(WRITE_COOKIE, 0))
+    except ValueError:
+        return 0
+
+
+def note_write(request):
+    """
+    Mark ``request`` as having written, for writes made by safe methods
+    such as the view recorded by ``GET /api/blogs/<id>/``.
+    """
+    setattr(getattr(request, '_request', request), WROTE_ATTR, True)
+
+
+def _remember_write(request, response):
+    """
+    After a successful write, keep the client on the primary until a replica
+    has caught up with it. Replicas further behind than the max lag are not
+    used at all, so the cookie only needs to outlive that.
+    """
+    wrote = request.method not in SAFE_METHODS or getattr(request, WROTE_ATTR, False)
+    if wrote and response.status_code < 400:
+        max_lag = getattr(settings, 'ANALYTICS_REPLICA_MAX_LAG', 30.0)
+        response.set_cookie(
+            WRITE_COOKIE, f"{time.time():.3f}",
+            max_age=math.ceil(max_lag) + 1, httponly=True, samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_read_middleware(get_response):
+    """
+    Route the database reads of safe requests to read replicas, with
+    read-your-writes stickiness for clients that wrote recently.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not read_replicas():
+                return await get_response(request)
+            if request.method in SAFE_METHODS:
+                with replica_reads(_last_write(request)):
+                    return _remember_write(request, await get_response(request))
+            return _remember_write(request, await get_response(request))
+    else:
+        def middleware(request):
+            if not read_replicas():
+                return get_response(request)
+            if request.method in SAFE_METHODS:
+                with replica_reads(_last_write(request)):
+                    return _remember_write(request, get_response(request))
+            return _remember_write(request, get_response(request))
+
+    return middleware
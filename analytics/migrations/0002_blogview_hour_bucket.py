@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogview',
+            name='hour_bucket',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='blogview',
+            constraint=models.UniqueConstraint(fields=('blog', 'hour_bucket'), name='analytics_blogview_blog_hour_uniq'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_dimensions(apps, schema_editor):
+    Blog = apps.get_model('analytics', 'Blog')
+    BlogView = apps.get_model('analytics', 'BlogView')
+    db_alias = schema_editor.connection.alias
+    BlogView.objects.using(db_alias).update(
+        author_id=models.Subquery(
+            Blog.objects.using(db_alias)
+            .filter(pk=models.OuterRef('blog_id'))
+            .values('author_id')[:1]
+        ),
+        country_id=models.Subquery(
+            Blog.objects.using(db_alias)
+            .filter(pk=models.OuterRef('blog_id'))
+            .values('author__country_id')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_blogview_hour_bucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogview',
+            name='author',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='analytics.user'),
+        ),
+        migrations.AddField(
+            model_name='blogview',
+            name='country',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='analytics.country'),
+        ),
+        migrations.AddIndex(
+            model_name='blogview',
+            index=models.Index(fields=['country', 'viewed_at', 'blog', 'count'], name='analytics_b_country_3d2aa8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogview',
+            index=models.Index(fields=['author', 'viewed_at', 'blog', 'count'], name='analytics_b_author__c424cd_idx'),
+        ),
+        migrations.RunPython(backfill_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_blogview_author_country'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardedBlogView',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('viewed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('hour_bucket', models.DateTimeField()),
+                ('author', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='analytics.user')),
+                ('blog', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='analytics.blog')),
+                ('country', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='analytics.country')),
+            ],
+            options={
+                'db_table': 'analytics_shardedblogview',
+                'indexes': [models.Index(fields=['viewed_at', 'blog', 'count'], name='analytics_s_viewed__713909_idx'), models.Index(fields=['country', 'viewed_at', 'blog', 'count'], name='analytics_s_country_8bab78_idx'), models.Index(fields=['author', 'viewed_at', 'blog', 'count'], name='analytics_s_author__63555a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('blog', 'hour_bucket'), name='analytics_shardedblogview_blog_hour_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_shardedblogview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogViewSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('viewed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('hour_bucket', models.DateTimeField()),
+                ('weight', models.FloatField()),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='analytics.user')),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='analytics.blog')),
+                ('country', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='analytics.country')),
+            ],
+            options={
+                'db_table': 'analytics_blogviewsample',
+                'indexes': [models.Index(fields=['viewed_at', 'blog', 'count', 'weight'], name='analytics_b_viewed__93a314_idx')],
+                'constraints': [models.UniqueConstraint(fields=('blog', 'hour_bucket'), name='analytics_blogviewsample_blog_hour_uniq')],
+            },
+        ),
+    ]
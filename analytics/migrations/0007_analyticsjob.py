@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:23
+
+import django.core.serializers.json
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_replicaheartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=32)),
+                ('spec', models.JSONField()),
+                ('spec_hash', models.CharField(max_length=64)),
+                ('client', models.CharField(max_length=128)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'analytics_analyticsjob',
+                'indexes': [models.Index(fields=['spec_hash', 'status', 'finished_at'], name='analytics_a_spec_ha_0cc164_idx'), models.Index(fields=['client', 'status'], name='analytics_a_client_e00ff2_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('spec_hash',), name='analytics_analyticsjob_active_spec_uniq')],
+            },
+        ),
+    ]
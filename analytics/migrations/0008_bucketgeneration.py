@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_analyticsjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BucketGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'analytics_bucketgeneration',
+            },
+        ),
+    ]
@@ -1,4 +1,8 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 class Country(models.Model):
     name = models.CharField(max_length=128, unique=True, db_index=True)
@@ -38,14 +42,148 @@ class BlogView(models.Model):
     blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name="views", db_index=True)
     viewed_at = models.DateTimeField(auto_now_add=True, db_index=True)
     count = models.PositiveIntegerField(default=1, db_index=True)
+    # Start of the hour this row counts views for. Legacy rows leave it NULL,
+    # which the unique constraint below ignores.
+    hour_bucket = models.DateTimeField(null=True, blank=True)
+    # Copies of blog.author and blog.author.country so analytics can group and
+    # filter without joining through Blog and User. Kept in sync by signals.
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", null=True, blank=True, db_index=False)
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name="+", null=True, blank=True, db_index=False)
 
     def __str__(self):
         return f"{self.blog.title} - {self.viewed_at}"
 
+    def save(self, *args, **kwargs):
+        if self.author_id is None:
+            self.author_id = self.blog.author_id
+        if self.country_id is None:
+            self.country_id = self.blog.author.country_id
+        super().save(*args, **kwargs)
+
     class Meta:
         db_table = 'analytics_blogview'
         indexes = [
             models.Index(fields=['viewed_at']),
             models.Index(fields=['blog', 'viewed_at']),
             models.Index(fields=['count']),
-        ]
\ No newline at end of file
+            models.Index(fields=['country', 'viewed_at', 'blog', 'count']),
+            models.Index(fields=['author', 'viewed_at', 'blog', 'count']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['blog', 'hour_bucket'],
+                name='analytics_blogview_blog_hour_uniq',
+            ),
+        ]
+
+class ShardedBlogView(models.Model):
+    """
+    Hourly view counters stored across ``ANALYTICS_VIEW_SHARDS`` by blog id.
+
+    Each shard is its own database, so relations to Blog, User and Country
+    carry no database constraint and cannot be joined; analytics resolve
+    blog attributes on ``default`` first.
+    """
+    blog = models.ForeignKey(Blog, on_delete=models.DO_NOTHING, related_name="+", db_constraint=False)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name="+", db_constraint=False, db_index=False)
+    country = models.ForeignKey(Country, on_delete=models.DO_NOTHING, related_name="+", db_constraint=False, db_index=False)
+    viewed_at = models.DateTimeField(default=timezone.now)
+    count = models.PositiveIntegerField(default=1)
+    hour_bucket = models.DateTimeField()
+
+    class Meta:
+        db_table = 'analytics_shardedblogview'
+        indexes = [
+            models.Index(fields=['viewed_at', 'blog', 'count']),
+            models.Index(fields=['country', 'viewed_at', 'blog', 'count']),
+            models.Index(fields=['author', 'viewed_at', 'blog', 'count']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['blog', 'hour_bucket'],
+                name='analytics_shardedblogview_blog_hour_uniq',
+            ),
+        ]
+
+class BlogViewSample(models.Model):
+    """
+    Bernoulli sample of recorded views for approximate analytics.
+
+    Every view is kept with probability ``1 / weight`` and counted in one row
+    per ``(blog, hour_bucket)``, so ``count * weight`` estimates the views
+    behind the row. Lives on ``default`` even when view rows are sharded.
+    """
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name="+")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False)
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name="+", db_index=False)
+    viewed_at = models.DateTimeField(default=timezone.now)
+    count = models.PositiveIntegerField(default=1)
+    hour_bucket = models.DateTimeField()
+    weight = models.FloatField()
+
+    class Meta:
+        db_table = 'analytics_blogviewsample'
+        indexes = [
+            models.Index(fields=['viewed_at', 'blog', 'count', 'weight']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['blog', 'hour_bucket'],
+                name='analytics_blogviewsample_blog_hour_uniq',
+            ),
+        ]
+
+class ReplicaHeartbeat(models.Model):
+    """
+    Single row stamped on the primary by ``refresh_replica``. A replica's
+    copy of it tells how far behind that replica is.
+    """
+    beat_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'analytics_replicaheartbeat'
+
+class BucketGeneration(models.Model):
+    """
+    Single row bumped whenever every cached blog-views bucket goes stale.
+    Stored on the primary so a bump from any process, e.g. a management
+    command, reaches the buckets cached by every other one.
+    """
+    value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'analytics_bucketgeneration'
+
+class AnalyticsJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=32)
+    spec = models.JSONField()
+    spec_hash = models.CharField(max_length=64)
+    client = models.CharField(max_length=128)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'analytics_analyticsjob'
+        indexes = [
+            models.Index(fields=['spec_hash', 'status', 'finished_at']),
+            models.Index(fields=['client', 'status']),
+        ]
+        constraints = [
+            # At most one unfinished job per spec; duplicates join it.
+            models.UniqueConstraint(
+                fields=['spec_hash'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='analytics_analyticsjob_active_spec_uniq',
+            ),
+        ]
@@ -0,0 +1,160 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError
+
+# Set for the duration of a request that may read from replicas; holds the
+# time of the client's last write, or 0 when it has not written recently.
+_replica_reads = ContextVar('analytics_replica_reads', default=None)
+_heartbeats = {}
+# Sharded rows live on their own databases; jobs are polled right after
+# being submitted and must not look missing or stale, and a lagging bucket
+# generation would serve buckets that were already invalidated.
+PRIMARY_ONLY_MODELS = {'shardedblogview', 'analyticsjob', 'bucketgeneration'}
+
+
+def view_shards():
+    """Database aliases holding sharded view rows; empty when sharding is off."""
+    return list(getattr(settings, 'ANALYTICS_VIEW_SHARDS', []))
+
+
+def read_replicas():
+    """Database aliases holding read-only copies of ``default``."""
+    return list(getattr(settings, 'ANALYTICS_READ_REPLICAS', []))
+
+
+@contextmanager
+def replica_reads(written_at=0):
+    """
+    Let reads inside the block go to a replica that is no more than
+    ``ANALYTICS_REPLICA_MAX_LAG`` seconds behind and, when ``written_at`` is
+    given, has caught up with that write.
+    """
+    token = _replica_reads.set(written_at)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Keep reads inside the block on the primary, even within ``replica_reads``."""
+    token = _replica_reads.set(None)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def shard_for_blog(blog_id):
+    shards = view_shards()
+    # Blog ids are dense integers, so modulo spreads them evenly.
+    return shards[blog_id % len(shards)]
+
+
+class ViewShardRouter:
+    """
+    Sends ``ShardedBlogView`` rows to one of ``ANALYTICS_VIEW_SHARDS`` by
+    blog id and keeps every other analytics model on ``default``.
+    """
+
+    def _shard_for_instance(self, model, hints):
+        if model._meta.model_name != 'shardedblogview' or not view_shards():
+            return None
+        instance = hints.get('instance')
+        if instance is not None and getattr(instance, 'blog_id', None) is not None:
+            return shard_for_blog(instance.blog_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard_for_instance(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard_for_instance(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Sharded rows reference blogs, users and countries on default
+        # without database-level constraints.
+        labels = {obj1._meta.model_name, obj2._meta.model_name}
+        if 'shardedblogview' in labels:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in view_shards():
+            return app_label == 'analytics' and model_name == 'shardedblogview'
+        if app_label != 'analytics':
+            return None
+        if model_name == 'shardedblogview':
+            return False
+        return None
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads made under ``replica_reads()`` to a healthy replica from
+    ``ANALYTICS_READ_REPLICAS``, and everything else to the primary.
+
+    A replica's lag is the age of its copy of ``ReplicaHeartbeat``, checked
+    at most once per ``ANALYTICS_REPLICA_LAG_CHECK`` seconds. Replicas that
+    lag too far, have not caught up with the client's last write or cannot
+    be read fall back to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        written_at = _replica_reads.get()
+        if written_at is None or model._meta.app_label != 'analytics':
+            return None
+        if model._meta.model_name in PRIMARY_ONLY_MODELS:
+            return None
+
+        healthy = [
+            alias for alias in read_replicas()
+            if self.replica_is_usable(alias, written_at)
+        ]
+        return random.choice(healthy) if healthy else None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        copies = {'default', *read_replicas()}
+        if obj1._state.db in copies and obj2._state.db in copies:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in read_replicas():
+            return False
+        return None
+
+    @staticmethod
+    def replica_is_usable(alias, written_at):
+        beat_at = ReadReplicaRouter.heartbeat(alias)
+        if beat_at is None:
+            return False
+        max_lag = getattr(settings, 'ANALYTICS_REPLICA_MAX_LAG', 30.0)
+        return beat_at >= max(written_at, time.time() - max_lag)
+
+    @staticmethod
+    def heartbeat(alias):
+        """Epoch seconds of the replica's heartbeat, or None if unreadable."""
+        from .models import ReplicaHeartbeat
+
+        checked, beat_at = _heartbeats.get(alias, (None, None))
+        interval = getattr(settings, 'ANALYTICS_REPLICA_LAG_CHECK', 1.0)
+        if checked is not None and time.monotonic() - checked < interval:
+            return beat_at
+
+        try:
+            beat = ReplicaHeartbeat.objects.using(alias).values_list('beat_at', flat=True).first()
+        except DatabaseError:
+            beat = None
+        beat_at = beat.timestamp() if beat is not None else None
+        _heartbeats[alias] = (time.monotonic(), beat_at)
+        return beat_at
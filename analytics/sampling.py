@@ -0,0 +1,141 @@
+import math
+import random
+
+from django.conf import settings
+from django.db import connection, transaction
+from .models import Blog, BlogViewSample
+
+
+class ViewSampler:
+    """
+    Keeps ``BlogViewSample`` in step with recorded views.
+
+    Each view is sampled independently with probability
+    ``ANALYTICS_SAMPLE_RATE``, both when it is recorded and when the sample
+    is rebuilt from existing rows, so estimates are unbiased whichever way a
+    view got in. ``0`` turns sampling and ``mode=approx`` off.
+    """
+
+    @staticmethod
+    def rate():
+        return getattr(settings, 'ANALYTICS_SAMPLE_RATE', 0.01)
+
+    @staticmethod
+    def record(blog, when, hour_bucket):
+        rate = ViewSampler.rate()
+        if not rate or random.random() >= rate:
+            return
+
+        ViewSampler._upsert([BlogViewSample(
+            blog_id=blog.pk,
+            author_id=blog.author_id,
+            country_id=blog.author.country_id,
+            viewed_at=when,
+            hour_bucket=hour_bucket,
+            count=1,
+            weight=1 / rate,
+        )])
+    
+    @staticmethod
+    def _upsert(samples):
+        """Insert ``samples``, adding their counts to rows already sampled."""
+        ops = connection.ops
+        table = ops.quote_name(BlogViewSample._meta.db_table)
+        sql = (
+            f"INSERT INTO {table} "
+            f"(blog_id, author_id, country_id, viewed_at, count, hour_bucket, weight) "
+            f"VALUES (%s, %s, %s, %s, %s, %s, %s) "
+            f"ON CONFLICT (blog_id, hour_bucket) DO UPDATE SET "
+            f"count = {table}.count + excluded.count, "
+            f"viewed_at = MAX({table}.viewed_at, excluded.viewed_at)"
+        )
+        params = [
+            [
+                sample.blog_id,
+                sample.author_id,
+                sample.country_id,
+                ops.adapt_datetimefield_value(sample.viewed_at),
+                sample.count,
+                ops.adapt_datetimefield_value(sample.hour_bucket),
+                sample.weight,
+            ]
+            for sample in samples
+        ]
+        if params:
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+
+    @staticmethod
+    def rebuild(sources, batch_size=5000, seed=None):
+        """
+        Replace the sample with a fresh one drawn from ``sources``, an
+        iterable of view querysets. Returns ``(rows_read, rows_sampled)``.
+        """
+        rate = ViewSampler.rate()
+        rng = random.Random(seed)
+        BlogViewSample.objects.all().delete()
+        if not rate:
+            return 0, 0
+
+        read = sampled = 0
+        blog_dimensions = None
+        for views in sources:
+            last_id = 0
+            while True:
+                rows = list(
+                    views.filter(id__gt=last_id).order_by('id')
+                    .values('id', 'blog_id', 'author_id', 'country_id', 'viewed_at', 'count', 'hour_bucket')
+                    [:batch_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                read += len(rows)
+
+                merged = {}
+                for row in rows:
+                    kept = ViewSampler.binomial(rng, row['count'], rate)
+                    if not kept:
+                        continue
+                    if row['author_id'] is None or row['country_id'] is None:
+                        # Legacy rows may predate the denormalized columns.
+                        if blog_dimensions is None:
+                            blog_dimensions = {
+                                blog_id: (author_id, country_id)
+                                for blog_id, author_id, country_id in Blog.objects.values_list(
+                                    'id', 'author_id', 'author__country_id'
+                                )
+                            }
+                        row['author_id'], row['country_id'] = blog_dimensions[row['blog_id']]
+                    # Legacy rows have no hour bucket; use the hour they were last seen.
+                    hour_bucket = row['hour_bucket'] or row['viewed_at'].replace(minute=0, second=0, microsecond=0)
+                    entry = merged.setdefault((row['blog_id'], hour_bucket), BlogViewSample(
+                        blog_id=row['blog_id'],
+                        author_id=row['author_id'],
+                        country_id=row['country_id'],
+                        viewed_at=row['viewed_at'],
+                        hour_bucket=hour_bucket,
+                        count=0,
+                        weight=1 / rate,
+                    ))
+                    entry.count += kept
+                    entry.viewed_at = max(entry.viewed_at, row['viewed_at'])
+
+                with transaction.atomic():
+                    ViewSampler._upsert(merged.values())
+                sampled += len(merged)
+        return read, sampled
+
+    @staticmethod
+    def binomial(rng, n, p):
+        """Successes in ``n`` trials of probability ``p``, in O(n * p) draws."""
+        if p >= 1:
+            return n
+        # Jump straight from one success to the next with geometric gaps.
+        log_q = math.log(1 - p)
+        successes = trial = 0
+        while True:
+            trial += int(math.log(1 - rng.random()) / log_q) + 1
+            if trial > n:
+                return successes
+            successes += 1
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import User, Blog, BlogView
+from .services import AnalyticsService
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,6 +14,17 @@ class BlogSerializer(serializers.ModelSerializer):
         model = Blog
         fields = ['id', 'title', 'author', 'author_name', 'created_at']
 
+class BlogViewStatsSerializer(serializers.Serializer):
+    include = serializers.CharField(required=False, default='')
+    sparkline_days = serializers.IntegerField(required=False, min_value=1, max_value=90)
+
+    def validate_include(self, value):
+        include = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = include - {'total_views', 'sparkline'}
+        if unknown:
+            raise serializers.ValidationError(f"Unknown value(s): {', '.join(sorted(unknown))}.")
+        return include
+
 class BlogViewSerializer(serializers.ModelSerializer):
     blog_title = serializers.CharField(source='blog.title', read_only=True)
     
@@ -23,10 +35,29 @@ class BlogViewSerializer(serializers.ModelSerializer):
 class BlogViewsAnalyticsSerializer(serializers.Serializer):
     object_type = serializers.ChoiceField(choices=['country', 'user'])
     range = serializers.ChoiceField(choices=['week', 'month', 'year'])
+    mode = serializers.ChoiceField(choices=['exact', 'approx'], required=False, default='exact')
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=1000)
+    cursor = serializers.CharField(required=False)
+
+    def validate_cursor(self, value):
+        try:
+            return AnalyticsService.decode_cursor(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, attrs):
+        paged = attrs.get('limit') or attrs.get('page_size') or attrs.get('cursor')
+        if paged and attrs.get('mode') == 'approx':
+            raise serializers.ValidationError("limit, page_size and cursor are not available with mode=approx.")
+        if attrs.get('cursor') and not attrs.get('page_size'):
+            raise serializers.ValidationError({'page_size': "Required with cursor."})
+        return attrs
 
 class TopAnalyticsSerializer(serializers.Serializer):
     top = serializers.ChoiceField(choices=['user', 'country', 'blog'])
     time_range = serializers.CharField(required=False)
+    mode = serializers.ChoiceField(choices=['exact', 'approx'], required=False, default='exact')
 
 class PerformanceAnalyticsSerializer(serializers.Serializer):
     compare = serializers.ChoiceField(choices=['day', 'week', 'month', 'year'])
@@ -1,153 +1,1116 @@
-from django.db.models import Count, Sum, Q, F, Window
-from django.db.models.functions import Trunc, Lag
+from array import array
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.db import connections, IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum, Q, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Rank, Trunc
 from django.utils import timezone
-from datetime import timedelta
-from .models import Blog, BlogView, User, Country
+from datetime import datetime, time, timedelta
+import base64
+import contextvars
+import hashlib
+import json
+import math
+import random
+import threading
+from time import monotonic, perf_counter
+from . import instrumentation
+from .models import Blog, BlogView, BlogViewSample, BucketGeneration, ShardedBlogView, User, Country
 from .filters import DynamicFilter
+from .guards import QueryBudgetExceeded, QueryGuard, budgeted
+from .routers import primary_reads, view_shards
+from .sampling import ViewSampler
+
+# BlogView carries denormalized author/country columns, so filters on those
+# paths skip the Blog and User joins.
+VIEW_FIELD_ALIASES = {
+    'blog__author__country': 'country',
+    'blog__author': 'author',
+}
 
 class AnalyticsService:
+    _sealer = None
+    _sealing = {}
+    _seal_lock = threading.Lock()
  
     @staticmethod
-    def get_blog_views_analytics(object_type, range_type, filters_config=None):
+    @budgeted
+    def get_blog_views_analytics(object_type, range_type, filters_config=None, approx=False):
      
-        base_qs = BlogView.objects.select_related(
-            'blog', 'blog__author', 'blog__author__country'
+        QueryGuard.check_filters(filters_config)
+        
+        if object_type == 'country':
+            group_field = 'country_id'
+        else:  
+            group_field = 'author_id'
+        
+        date_trunc = AnalyticsService._get_date_trunc(range_type)
+        
+        # Past days are sealed buckets cached for ANALYTICS_BUCKET_TIMEOUT;
+        # only today's rows are aggregated on every request.
+        today = timezone.localdate()
+        start_day = timezone.localdate(
+            AnalyticsService._get_range_start_date(range_type)
         )
         
-        if filters_config:
-            q_object = DynamicFilter.build_q_object(filters_config)
-            base_qs = base_qs.filter(q_object)
+        if approx and ViewSampler.rate():
+            return AnalyticsService._approx_blog_views(
+                group_field, date_trunc, start_day, filters_config
+            )
         
-      
+        buckets = AnalyticsService._get_sealed_buckets(
+            group_field, filters_config, start_day, today
+        )
+        buckets[today] = AnalyticsService._compute_buckets(
+            group_field, filters_config, today, None
+        ).get(today, [])
+        
+        return AnalyticsService._merge_buckets(buckets, date_trunc, group_field)
+    
+    @staticmethod
+    @budgeted
+    def get_blog_views_page(object_type, range_type, filters_config=None, limit=None, page_size=None, cursor=None):
+        """
+        Blog-views rows ordered by period and then views, optionally cut to
+        the top ``limit`` groups per period and returned ``page_size`` rows at
+        a time. Returns ``{'data': rows, 'next': cursor or None}``.
+
+        Periods are ranked one at a time, starting at the cursor's, with a
+        window function; the rank seek and the LIMIT apply in SQL, so a page
+        only aggregates the periods it covers and fetches about one page of
+        rows.
+        """
+        QueryGuard.check_filters(filters_config)
+        
+        group_field = 'country_id' if object_type == 'country' else 'author_id'
         date_trunc = AnalyticsService._get_date_trunc(range_type)
-        start_date = AnalyticsService._get_range_start_date(range_type)
-        base_qs = base_qs.filter(viewed_at__gte=start_date)
+        today = timezone.localdate()
+        start_day = timezone.localdate(
+            AnalyticsService._get_range_start_date(range_type)
+        )
+        q_object = AnalyticsService._view_filter_q(filters_config)
         
-     
-        if object_type == 'country':
-            group_field = 'blog__author__country__name'
-        else:  
-            group_field = 'blog__author__username'
+        # One row past the page tells whether there is a next one.
+        wanted = page_size + 1 if page_size else None
+        rows = []
+        for low, high in AnalyticsService._split_bounds(start_day, today + timedelta(days=1), date_trunc):
+            period = AnalyticsService._truncate_day(low, date_trunc)
+            if cursor and period.isoformat() < cursor[0]:
+                continue
+            after = cursor[1] if cursor and period.isoformat() == cursor[0] else 0
+            
+            period_q = q_object & Q(viewed_at__gte=AnalyticsService._day_start(low))
+            if high <= today:
+                # The current period stays open-ended, like today's bucket.
+                period_q &= Q(viewed_at__lt=AnalyticsService._day_start(high))
+            rank_period = (
+                AnalyticsService._rank_merged_period
+                if len(AnalyticsService._view_sources()) > 1
+                else AnalyticsService._rank_period
+            )
+            rows += [
+                (period,) + row
+                for row in rank_period(
+                    group_field, period_q, filters_config, limit, after,
+                    wanted - len(rows) if wanted else None,
+                )
+            ]
+            if wanted and len(rows) >= wanted:
+                break
         
- 
-        analytics_data = (
-            base_qs
-            .annotate(period=Trunc('viewed_at', date_trunc))
-            .values('period', group_field)
-            .annotate(
-                number_of_blogs=Count('blog_id', distinct=True),
-                total_views=Sum('count')
+        next_cursor = None
+        if page_size and len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = AnalyticsService.encode_cursor(rows[-1][0].isoformat(), rows[-1][4])
+        
+        labels = AnalyticsService._group_labels(group_field, {row[1] for row in rows})
+        return {
+            'data': [
+                {
+                    'period': period.isoformat(),
+                    'x': labels.get(group),
+                    'y': number_of_blogs,
+                    'z': total_views,
+                }
+                for period, group, number_of_blogs, total_views, rank in rows
+            ],
+            'next': next_cursor,
+        }
+    
+    @staticmethod
+    def _rank_period(group_field, q_object, filters_config, limit, after, count):
+        """
+        ``(group, y, z, rank)`` rows of one period ranked by views with a
+        window function, keeping ranks past ``after`` (and up to ``limit``),
+        at most ``count`` of them.
+        """
+        model, using = AnalyticsService._view_sources()[0]
+        ranked = (
+            AnalyticsService._views(model, using, q_object)
+            .values(group_field)
+            .annotate(y=Count('blog_id', distinct=True), z=Sum('count'))
+            .annotate(rank=Window(Rank(), order_by=[F('z').desc(), F(group_field).asc()]))
+            .order_by()
+        )
+        QueryGuard.check_queryset(ranked, filters_config)
+        
+        connection = connections[ranked.db]
+        quote = connection.ops.quote_name
+        rank = quote('rank')
+        try:
+            inner_sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            # The filter matched no blogs at all.
+            return []
+        params = list(params) + [after]
+        sql = (
+            f"SELECT {quote(group_field)}, {quote('y')}, {quote('z')}, {rank} "
+            f"FROM ({inner_sql}) ranked WHERE {rank} > %s"
+        )
+        if limit:
+            sql += f" AND {rank} <= %s"
+            params.append(limit)
+        sql += f" ORDER BY {rank}"
+        if count:
+            sql += " LIMIT %s"
+            params.append(count)
+        
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(sql, params)
+            return [tuple(row) for row in db_cursor.fetchall()]
+    
+    @staticmethod
+    def _rank_merged_period(group_field, q_object, filters_config, limit, after, count):
+        """
+        ``_rank_period`` for sharded views: a group's totals are spread over
+        shards, so the period's partial totals are merged and ranked here.
+        A blog lives on one shard, so distinct blog counts add up exactly.
+        """
+        def compute(model, using, partition):
+            rows = (
+                AnalyticsService._views(model, using, q_object)
+                .values(group_field)
+                .annotate(y=Count('blog_id', distinct=True), z=Sum('count'))
+                .order_by()
             )
-            .order_by('period', group_field)
+            QueryGuard.check_queryset(rows, filters_config)
+            return list(rows)
+        
+        merged = {}
+        for rows in AnalyticsService._scatter(compute, name='blog_views_page'):
+            for item in rows:
+                entry = merged.setdefault(item[group_field], [0, 0])
+                entry[0] += item['y']
+                entry[1] += item['z']
+        
+        ordered = sorted(merged.items(), key=lambda item: (-item[1][1], item[0] or 0))
+        if limit:
+            ordered = ordered[:limit]
+        ranked = [
+            (group, number_of_blogs, total_views, rank)
+            for rank, (group, (number_of_blogs, total_views)) in enumerate(ordered, start=1)
+            if rank > after
+        ]
+        return ranked[:count] if count else ranked
+    
+    @staticmethod
+    def encode_cursor(period, rank):
+        raw = json.dumps([str(period), rank]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """``(period, rank)`` from an ``encode_cursor`` value; ValueError if malformed."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            period, rank = json.loads(raw)
+        except (TypeError, ValueError, UnicodeDecodeError) as e:
+            raise ValueError("Invalid cursor.") from e
+        if not isinstance(period, str) or not isinstance(rank, int):
+            raise ValueError("Invalid cursor.")
+        return period, rank
+    
+    @staticmethod
+    def _get_sealed_buckets(group_field, filters_config, start_day, end_day):
+        days = [
+            start_day + timedelta(days=offset)
+            for offset in range((end_day - start_day).days)
+        ]
+        if not days:
+            return {}
+        
+        filters_hash = hashlib.md5(
+            json.dumps(filters_config, sort_keys=True).encode()
+        ).hexdigest()
+        versions = cache.get_many(
+            [AnalyticsService._bucket_version_key(day) for day in days]
         )
+        generation = AnalyticsService._bucket_generation()
+        if filters_config:
+            # Filtered buckets depend on which blogs match, which changes
+            # with blog, user and country edits.
+            generation = f"{generation}.{AnalyticsService._blog_set_version()}"
+        keys = {
+            day: "analytics:bucket:{}:{}:{}:{}:{}".format(
+                group_field,
+                filters_hash,
+                day.isoformat(),
+                generation,
+                versions.get(AnalyticsService._bucket_version_key(day), 0),
+            )
+            for day in days
+        }
+        
+        cached = cache.get_many(list(keys.values()))
+        buckets = {day: cached[key] for day, key in keys.items() if key in cached}
+        
+        missing = [day for day in days if day not in buckets]
+        if missing:
+            futures = [
+                AnalyticsService._seal(group_field, filters_config, {day: keys[day] for day in chunk})
+                for chunk in AnalyticsService._seal_chunks(missing)
+            ]
+            deadline = QueryGuard.current_deadline()
+            done, pending = wait(
+                futures,
+                timeout=None if deadline is None else max(deadline - monotonic(), 0),
+            )
+            if pending:
+                # Finished chunks are already cached and the rest keep
+                # running, so every retry has less left to do.
+                raise QueryBudgetExceeded(
+                    f"Blog views for {len(missing)} past days are still being "
+                    f"aggregated ({len(pending)} of {len(futures)} months left); retry shortly."
+                )
+            for future in done:
+                buckets.update(future.result())
+        
+        return buckets
+    
+    @staticmethod
+    def _seal_chunks(days):
+        """Split sorted ``days`` into runs of consecutive days within one month."""
+        chunks = []
+        for day in days:
+            previous = chunks[-1][-1] if chunks else None
+            if previous is not None and day - previous == timedelta(days=1) and day.month == previous.month:
+                chunks[-1].append(day)
+            else:
+                chunks.append([day])
+        return chunks
+    
+    @staticmethod
+    def _seal(group_field, filters_config, keys):
+        """
+        Aggregate and cache the buckets of ``keys`` (day -> cache key) on
+        the sealer pool, sharing the future with any request already
+        sealing the same days.
+        """
+        chunk = tuple(keys.values())
+        max_cost = QueryGuard.max_query_cost()
         
+        def run():
+            try:
+                # A lagging replica may not have a day's last views yet, and
+                # a sealed bucket is never recomputed, so seal from the
+                # primary, on a budget of its own rather than the request's.
+                with primary_reads(), QueryGuard.limits(AnalyticsService._seal_timeout(), max_cost):
+                    with QueryGuard.execution_budget():
+                        days = list(keys)
+                        computed = AnalyticsService._compute_buckets(
+                            group_field, filters_config, days[0], days[-1] + timedelta(days=1)
+                        )
+                fresh = {day: computed.get(day, []) for day in keys}
+                cache.set_many(
+                    {keys[day]: rows for day, rows in fresh.items()},
+                    AnalyticsService._bucket_timeout(),
+                )
+                return fresh
+            finally:
+                with AnalyticsService._seal_lock:
+                    AnalyticsService._sealing.pop(chunk, None)
+                connections.close_all()
+        
+        with AnalyticsService._seal_lock:
+            future = AnalyticsService._sealing.get(chunk)
+            if future is None:
+                if AnalyticsService._sealer is None:
+                    AnalyticsService._sealer = ThreadPoolExecutor(
+                        max_workers=getattr(settings, 'ANALYTICS_SEAL_WORKERS', 2),
+                        thread_name_prefix='analytics-seal',
+                    )
+                future = AnalyticsService._sealer.submit(contextvars.copy_context().run, run)
+                AnalyticsService._sealing[chunk] = future
+            return future
+    
+    @staticmethod
+    def _seal_timeout():
+        return getattr(settings, 'ANALYTICS_SEAL_TIMEOUT', 120.0)
+    
+    @staticmethod
+    def _compute_buckets(group_field, filters_config, start_day, end_day):
+        """
+        Aggregate views per (day, group, blog) between ``start_day`` and
+        ``end_day`` (exclusive, open-ended when None).
+
+        Keeping the blog id in each bucket row lets distinct blog counts be
+        merged exactly across days.
+        """
+        q_object = AnalyticsService._view_filter_q(filters_config)
+        q_object &= Q(viewed_at__gte=AnalyticsService._day_start(start_day))
+        if end_day is not None:
+            q_object &= Q(viewed_at__lt=AnalyticsService._day_start(end_day))
+        
+        def compute(model, using, partition):
+            rows = (
+                AnalyticsService._views(model, using, q_object & partition)
+                .annotate(day=Trunc('viewed_at', 'day'))
+                .values('day', group_field, 'blog_id')
+                .annotate(views=Sum('count'))
+                .order_by()
+            )
+            QueryGuard.check_queryset(rows, filters_config)
+            return list(rows)
+        
+        partitions = AnalyticsService._partition_window(start_day, end_day)
+        buckets = {}
+        for rows in AnalyticsService._scatter(compute, partitions, 'blog_views_buckets'):
+            for item in rows:
+                buckets.setdefault(item['day'].date(), []).append(
+                    (item[group_field], item['blog_id'], item['views'])
+                )
+        return buckets
+    
+    @staticmethod
+    def _merge_bucket_groups(buckets, date_trunc):
+        """``{(period, group): [blog ids, views]}`` from day buckets."""
+        merged = {}
+        for day, rows in buckets.items():
+            period = AnalyticsService._truncate_day(day, date_trunc)
+            for group, blog_id, views in rows:
+                entry = merged.setdefault((period, group), [set(), 0])
+                entry[0].add(blog_id)
+                entry[1] += views or 0
+        return merged
+    
+    @staticmethod
+    def _merge_buckets(buckets, date_trunc, group_field):
+        merged = AnalyticsService._merge_bucket_groups(buckets, date_trunc)
+        
+        labels = AnalyticsService._group_labels(
+            group_field, {group for _, group in merged}
+        )
+        # Groups whose user or country is gone have no label; sort them
+        # first instead of comparing None with names.
+        rows = sorted(
+            (
+                (period, labels.get(group), group, blog_ids, total_views)
+                for (period, group), (blog_ids, total_views) in merged.items()
+            ),
+            key=lambda row: (row[0], row[1] or '', row[2] or 0),
+        )
         return [
             {
-                'x': item[group_field],
-                'y': item['number_of_blogs'],
-                'z': item['total_views']
+                'x': label,
+                'y': len(blog_ids),
+                'z': total_views
             }
-            for item in analytics_data
+            for period, label, group, blog_ids, total_views in rows
         ]
     
     @staticmethod
-    def get_top_analytics(top_type, filters_config=None, time_range=None):
-     
-        base_qs = BlogView.objects.all()
+    def _group_labels(group_field, ids):
+        if not ids:
+            return {}
+        if group_field == 'country_id':
+            return dict(Country.objects.filter(pk__in=ids).values_list('id', 'name'))
+        return dict(User.objects.filter(pk__in=ids).values_list('id', 'username'))
+    
+    @staticmethod
+    def _view_sources():
+        """
+        ``(model, database alias)`` pairs holding view rows: every shard when
+        ``ANALYTICS_VIEW_SHARDS`` is set, otherwise BlogView on the router's
+        default.
+        """
+        shards = view_shards()
+        if shards:
+            return [(ShardedBlogView, alias) for alias in shards]
+        return [(BlogView, None)]
+    
+    @staticmethod
+    def _scatter(func, partitions=None, name=None):
+        """
+        Run ``func(model, using, partition)`` for every view source and time
+        partition (a Q on ``viewed_at``) and return the partial results.
+
+        Tasks run in parallel when there is more than one, each worker on
+        its own connection and under the caller's execution deadline; the
+        measured speedup is recorded in the instrumentation.
+        """
+        split, partition_qs = partitions or (None, [Q()])
+        tasks = [
+            (model, using, partition)
+            for model, using in AnalyticsService._view_sources()
+            for partition in partition_qs
+        ]
+        if len(tasks) == 1:
+            return [func(*tasks[0])]
         
-        if filters_config:
-            q_object = DynamicFilter.build_q_object(filters_config)
-            base_qs = base_qs.filter(q_object)
+        deadline = QueryGuard.current_deadline()
+        durations = []
+        
+        def run(task, context):
+            started = perf_counter()
+            try:
+                with QueryGuard.execution_budget(deadline=deadline):
+                    # The caller's context carries its replica routing.
+                    return context.run(func, *task)
+            finally:
+                durations.append(perf_counter() - started)
+                connections.close_all()
+        
+        workers = min(len(tasks), max(AnalyticsService._parallel_workers(), len(AnalyticsService._view_sources())))
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, tasks, [contextvars.copy_context() for _ in tasks]))
+        wall = perf_counter() - started
+        
+        instrumentation.record(
+            'parallel_query',
+            query=name,
+            tasks=len(tasks),
+            workers=workers,
+            split=split,
+            partitions=len(partition_qs),
+            wall_seconds=round(wall, 4),
+            serial_seconds=round(sum(durations), 4),
+            # Serial work over wall time: the speedup versus one connection.
+            speedup=round(sum(durations) / wall, 2) if wall else None,
+        )
+        return results
+    
+    @staticmethod
+    def _parallel_workers():
+        return getattr(settings, 'ANALYTICS_PARALLEL_WORKERS', 0)
+    
+    @staticmethod
+    def _partition_window(start_day, end_day):
+        """
+        Split ``[start_day, end_day)`` into calendar-aligned sub-ranges for
+        parallel execution, or return None when partitioning is off or the
+        window is shorter than ``ANALYTICS_PARTITION_MIN_DAYS``.
+
+        ``ANALYTICS_PARTITION_SPLIT`` is ``'week'``, ``'month'``,
+        ``'quarter'``, ``'year'`` or ``'auto'``, which picks the finest split
+        giving at most four partitions per worker. The first and last
+        partitions are open-ended so rows outside the bounds are not lost.
+        """
+        workers = AnalyticsService._parallel_workers()
+        min_days = getattr(settings, 'ANALYTICS_PARTITION_MIN_DAYS', 60)
+        if not workers or end_day is None or (end_day - start_day).days < min_days:
+            return None
+        
+        split = getattr(settings, 'ANALYTICS_PARTITION_SPLIT', 'auto')
+        candidates = ['week', 'month', 'quarter', 'year'] if split == 'auto' else [split]
+        for split in candidates:
+            bounds = AnalyticsService._split_bounds(start_day, end_day, split)
+            if len(bounds) <= workers * 4:
+                break
+        if len(bounds) < 2:
+            return None
+        
+        partitions = []
+        for index, (low, high) in enumerate(bounds):
+            partition = Q()
+            if index > 0:
+                partition &= Q(viewed_at__gte=AnalyticsService._day_start(low))
+            if index < len(bounds) - 1:
+                partition &= Q(viewed_at__lt=AnalyticsService._day_start(high))
+            partitions.append(partition)
+        return split, partitions
+    
+    @staticmethod
+    def _split_bounds(start_day, end_day, split):
+        bounds = []
+        low = start_day
+        while low < end_day:
+            if split == 'week':
+                high = low - timedelta(days=low.weekday()) + timedelta(days=7)
+            elif split == 'year':
+                high = low.replace(year=low.year + 1, month=1, day=1)
+            else:
+                months = 3 if split == 'quarter' else 1
+                first_month = (low.month - 1) // months * months
+                month_index = low.year * 12 + first_month + months
+                high = low.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+            high = min(high, end_day)
+            bounds.append((low, high))
+            low = high
+        return bounds
+    
+    @staticmethod
+    def _view_bounds(q_object):
+        """First and last local day with matching view rows, across sources."""
+        partials = AnalyticsService._scatter(
+            lambda model, using, partition: AnalyticsService._views(model, using, q_object)
+            .aggregate(first=Min('viewed_at'), last=Max('viewed_at'))
+        )
+        firsts = [item['first'] for item in partials if item['first'] is not None]
+        lasts = [item['last'] for item in partials if item['last'] is not None]
+        if not firsts:
+            return None, None
+        return timezone.localdate(min(firsts)), timezone.localdate(max(lasts))
+    
+    @staticmethod
+    def _view_filter_q(filters_config):
+        if not filters_config:
+            return Q()
+        if AnalyticsService._is_blog_only(filters_config):
+            # Only blog/author/country attributes: one cached id set, no joins.
+            return AnalyticsService._blog_id_q(filters_config)
+        if view_shards():
+            # Shards cannot join to blogs, so blog attributes become id lists.
+            return DynamicFilter.build_q_object(
+                filters_config, VIEW_FIELD_ALIASES, AnalyticsService._resolve_blog_lookup
+            )
+        return DynamicFilter.build_q_object(filters_config, VIEW_FIELD_ALIASES)
+    
+    @staticmethod
+    def _resolve_blog_lookup(field, value):
+        """
+        Turn ``blog__<lookup>`` into ``blog_id__in`` the matching blog ids.
+        Every view row has exactly one blog, so this is exact, negated or not.
+        """
+        if not field.startswith('blog__') or field in ('blog__id', 'blog__pk'):
+            return None
+        if AnalyticsService._blog_lookup(field) is not None:
+            return AnalyticsService._blog_id_q({'eq': {field: value}})
+        blog_ids = Blog.objects.filter(
+            **{field[len('blog__'):]: value}
+        ).values_list('id', flat=True)
+        return AnalyticsService._blog_id_in(list(blog_ids))
+    
+    @staticmethod
+    def _is_blog_only(filters_config):
+        fields = DynamicFilter.lookup_fields(filters_config)
+        return bool(fields) and all(
+            AnalyticsService._blog_lookup(field) is not None for field in fields
+        )
+    
+    @staticmethod
+    def _blog_lookup(field):
+        """``field`` as a lookup on Blog, or None if it is not a blog attribute."""
+        if field == 'blog':
+            return 'id'
+        if field == 'blog_id' or field.startswith('blog_id__'):
+            return 'id' + field[len('blog_id'):]
+        if not field.startswith('blog__'):
+            return None
+        
+        lookup = field[len('blog__'):]
+        # Only follow forward relations: reverse ones (a blog's views, a
+        # user's other blogs) are multi-valued and would change what a
+        # negated condition means.
+        model = Blog
+        for part in lookup.split('__'):
+            if part == 'pk':
+                break
+            try:
+                model_field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                break
+            if not model_field.concrete:
+                return None
+            if not model_field.is_relation:
+                break
+            model = model_field.related_model
+        return lookup
+    
+    @staticmethod
+    def _blog_id_q(filters_config):
+        """
+        ``blog_id IN (...)`` for the blogs matching a blog-only filter. Sets
+        larger than ``ANALYTICS_BLOG_ID_SET_MAX_INLINE`` become a semi-join on
+        the blog table instead, except on shards, which cannot see it.
+        """
+        blog_ids = AnalyticsService.get_matching_blog_ids(filters_config)
+        if len(blog_ids) > AnalyticsService._max_inline_blog_ids() and not view_shards():
+            return Q(blog_id__in=Blog.objects.filter(
+                AnalyticsService._blog_q(filters_config)
+            ).values('id'))
+        return AnalyticsService._blog_id_in(blog_ids)
+    
+    @staticmethod
+    def _blog_id_in(blog_ids):
+        """
+        ``blog_id IN (...)`` for a list of ids. SQLite allows 32766
+        parameters per statement by default, so lists longer than
+        ``ANALYTICS_BLOG_ID_SET_MAX_INLINE`` are passed as one JSON array
+        and read back with ``json_each``.
+        """
+        if len(blog_ids) > AnalyticsService._max_inline_blog_ids():
+            return Q(blog_id__in=RawSQL(
+                "SELECT value FROM json_each(%s)", [json.dumps(list(blog_ids))]
+            ))
+        return Q(blog_id__in=list(blog_ids))
+    
+    @staticmethod
+    def _max_inline_blog_ids():
+        return getattr(settings, 'ANALYTICS_BLOG_ID_SET_MAX_INLINE', 5000)
+    
+    @staticmethod
+    def _blog_q(filters_config):
+        return DynamicFilter.build_q_object(
+            filters_config,
+            lookup_resolver=lambda field, value: Q(**{AnalyticsService._blog_lookup(field): value}),
+        )
+    
+    @staticmethod
+    def get_matching_blog_ids(filters_config):
+        """
+        Sorted ids of the blogs matching a blog-only filter, as a compact
+        integer array. Cached until a blog, user or country changes.
+
+        New blogs do not invalidate the sets: ids only grow, so each set
+        remembers the highest blog id it has seen and picks up the matching
+        newer blogs when there are any, wherever they were created.
+        """
+        filters_hash = hashlib.md5(
+            json.dumps(filters_config, sort_keys=True).encode()
+        ).hexdigest()
+        key = "analytics:blog-ids:{}:{}".format(
+            AnalyticsService._blog_set_version(), filters_hash
+        )
+        latest = Blog.objects.aggregate(latest=Max('id'))['latest'] or 0
+        seen, blog_ids = cache.get(key, (0, None))
+        if blog_ids is None or latest > seen:
+            newer = Blog.objects.filter(
+                AnalyticsService._blog_q(filters_config), id__gt=seen
+            ).order_by('id').values_list('id', flat=True)
+            blog_ids = (blog_ids or array('q')) + array('q', newer)
+            cache.set(key, (latest, blog_ids), getattr(settings, 'ANALYTICS_BLOG_ID_SET_TIMEOUT', 3600))
+        return blog_ids
+    
+    @staticmethod
+    def invalidate_blog_sets():
+        """Drop every cached blog id set, after a blog, user or country changes or is deleted."""
+        key = AnalyticsService._blog_set_version_key()
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+    
+    @staticmethod
+    def _blog_set_version():
+        return cache.get(AnalyticsService._blog_set_version_key(), 0)
+    
+    @staticmethod
+    def _blog_set_version_key():
+        return "analytics:blog-ids-version"
+    
+    @staticmethod
+    def _views(model, using, q_object):
+        queryset = model.objects.all()
+        if using:
+            queryset = queryset.using(using)
+        return queryset.filter(q_object)
+    
+    @staticmethod
+    @budgeted
+    def get_blog_totals():
+        """Total views per blog id across all view sources."""
+        totals = {}
+        partials = AnalyticsService._scatter(
+            lambda model, using, partition: list(
+                AnalyticsService._views(model, using, partition)
+                .values_list('blog_id')
+                .annotate(views=Sum('count'))
+                .order_by()
+            )
+        )
+        for rows in partials:
+            for blog_id, views in rows:
+                totals[blog_id] = totals.get(blog_id, 0) + views
+        return totals
+    
+    @staticmethod
+    @budgeted
+    def get_blog_view_history(blog_ids, days=0):
+        """
+        ``{blog_id: {'total_views': n, 'sparkline': [...]}}`` for ``blog_ids``,
+        the sparkline holding views per day for the last ``days`` days,
+        oldest first and today last.
+
+        Every day is a filtered sum in the same grouped query, so any number
+        of blogs costs one query per view source.
+        """
+        blog_ids = list(blog_ids)
+        if not blog_ids:
+            return {}
+
+        today = timezone.localdate()
+        day_starts = [
+            AnalyticsService._day_start(today - timedelta(days=offset))
+            for offset in range(days - 1, -1, -1)
+        ]
+        day_sums = {}
+        for index, start in enumerate(day_starts):
+            day_q = Q(viewed_at__gte=start)
+            if index + 1 < days:
+                day_q &= Q(viewed_at__lt=day_starts[index + 1])
+            day_sums[f'day_{index}'] = Sum('count', filter=day_q)
+
+        history = {
+            blog_id: {'total_views': 0, 'sparkline': [0] * days}
+            for blog_id in blog_ids
+        }
+        partials = AnalyticsService._scatter(
+            lambda model, using, partition: list(
+                AnalyticsService._views(model, using, partition & Q(blog_id__in=blog_ids))
+                .values('blog_id')
+                .annotate(total_views=Sum('count'), **day_sums)
+                .order_by()
+            )
+        )
+        for rows in partials:
+            for row in rows:
+                entry = history[row['blog_id']]
+                entry['total_views'] += row['total_views'] or 0
+                for index in range(days):
+                    entry['sparkline'][index] += row[f'day_{index}'] or 0
+        return history
+    
+    @staticmethod
+    def invalidate_sealed_bucket(day):
+        """
+        Drop every cached bucket for ``day``.
+
+        Needed whenever rows dated on an already sealed day are modified,
+        e.g. when the legacy write path moves a row's ``viewed_at``.
+        """
+        key = AnalyticsService._bucket_version_key(day)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+    
+    @staticmethod
+    def invalidate_all_buckets():
+        """
+        Drop every cached bucket, e.g. after a blog changes author or a user
+        changes country and the stored group ids move.
+        """
+        bumped = BucketGeneration.objects.filter(pk=1).update(value=F('value') + 1)
+        if not bumped:
+            try:
+                with transaction.atomic():
+                    BucketGeneration.objects.create(pk=1, value=1)
+            except IntegrityError:
+                BucketGeneration.objects.filter(pk=1).update(value=F('value') + 1)
+    
+    @staticmethod
+    def _bucket_generation():
+        return BucketGeneration.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+    
+    @staticmethod
+    def _bucket_timeout():
+        # Sealed days never change, and invalidation moves to new keys, so
+        # buckets live long; the random share spreads out their expiry.
+        timeout = getattr(settings, 'ANALYTICS_BUCKET_TIMEOUT', 7 * 86400)
+        return timeout + random.randint(0, timeout // 2)
+    
+    @staticmethod
+    def _bucket_version_key(day):
+        return f"analytics:bucket-version:{day.isoformat()}"
+    
+    @staticmethod
+    def _day_start(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+    
+    @staticmethod
+    def _truncate_day(day, date_trunc):
+        if date_trunc == 'week':
+            return day - timedelta(days=day.weekday())
+        elif date_trunc == 'month':
+            return day.replace(day=1)
+        elif date_trunc == 'year':
+            return day.replace(month=1, day=1)
+        return day
+    
+    @staticmethod
+    @budgeted
+    def get_top_analytics(top_type, filters_config=None, time_range=None, approx=False):
+     
+        q_object = AnalyticsService._view_filter_q(filters_config)
         
         if time_range:
             start_date = AnalyticsService._parse_time_range(time_range)
-            base_qs = base_qs.filter(viewed_at__gte=start_date)
+            q_object &= Q(viewed_at__gte=start_date)
+        
+        if approx and ViewSampler.rate():
+            return AnalyticsService._approx_top(top_type, q_object, filters_config)
         
         if top_type == 'blog':
-            return AnalyticsService._get_top_blogs(base_qs)
+            return AnalyticsService._get_top_blogs(q_object, filters_config)
         elif top_type == 'user':
-            return AnalyticsService._get_top_users(base_qs)
+            return AnalyticsService._get_top_users(q_object, filters_config)
         elif top_type == 'country':
-            return AnalyticsService._get_top_countries(base_qs)
+            return AnalyticsService._get_top_countries(q_object, filters_config)
     
     @staticmethod
-    def _get_top_blogs(queryset):
+    def _get_top_blogs(q_object, filters_config=None):
   
-        return list(
-            queryset
-            .select_related('blog', 'blog__author')
-            .filter(blog__isnull=False)  # Ensure blog exists
-            .values('blog_id', 'blog__title', 'blog__author__username')
-            .annotate(
-                x=F('blog__title'),
-                y=F('blog_id'),  # y represents blog ID for top blogs
-                z=Sum('count')
+        def compute(model, using, partition):
+            top_qs = (
+                AnalyticsService._views(model, using, q_object & partition)
+                .values('blog_id')
+                .annotate(z=Sum('count'))
+                .order_by('-z')[:10]
             )
-            .order_by('-z')[:10]
+            QueryGuard.check_queryset(top_qs, filters_config)
+            return list(top_qs)
+        
+        # A blog lives on exactly one shard, so the global top 10 is among
+        # the per-shard top 10s.
+        partials = AnalyticsService._scatter(compute)
+        top = sorted(
+            (item for rows in partials for item in rows), key=lambda item: -item['z']
+        )[:10]
+        
+        blogs = Blog.objects.select_related('author').in_bulk(
+            [item['blog_id'] for item in top]
         )
+        # Views of a blog deleted meanwhile may still be on a shard.
+        return [
+            {
+                'blog_id': item['blog_id'],
+                'blog__title': blogs[item['blog_id']].title,
+                'blog__author__username': blogs[item['blog_id']].author.username,
+                'x': blogs[item['blog_id']].title,
+                'y': item['blog_id'],  # y represents blog ID for top blogs
+                'z': item['z'],
+            }
+            for item in top
+            if item['blog_id'] in blogs
+        ]
     
     @staticmethod
-    def _get_top_users(queryset):
+    def _get_top_users(q_object, filters_config=None):
 
-        return list(
-            queryset
-            .select_related('blog__author')
-            .values('blog__author__username')
-            .annotate(
-                x=F('blog__author__username'),
-                y=Count('blog_id', distinct=True),
-                z=Sum('count')
+        return [
+            {
+                'blog__author__username': label,
+                'x': label,
+                'y': number_of_blogs,
+                'z': total_views,
+            }
+            for label, number_of_blogs, total_views in AnalyticsService._get_top_groups(
+                'author_id', q_object, filters_config
             )
-            .order_by('-z')[:10]
-        )
+        ]
     
     @staticmethod
-    def _get_top_countries(queryset):
+    def _get_top_countries(q_object, filters_config=None):
        
-        return list(
-            queryset
-            .select_related('blog__author__country')
-            .values('blog__author__country__name')
+        return [
+            {
+                'blog__author__country__name': label,
+                'x': label,
+                'y': number_of_blogs,
+                'z': total_views,
+            }
+            for label, number_of_blogs, total_views in AnalyticsService._get_top_groups(
+                'country_id', q_object, filters_config
+            )
+        ]
+    
+    @staticmethod
+    def _get_top_groups(group_field, q_object, filters_config=None):
+        """
+        Top 10 ``(label, number_of_blogs, total_views)`` by views.
+
+        An author's blogs can sit on several shards, so shards return every
+        group's partial totals rather than their own top 10. Blogs never
+        span shards, which makes the distinct blog counts additive.
+        """
+        sharded = len(AnalyticsService._view_sources()) > 1
+        
+        def compute(model, using, partition):
+            top_qs = (
+                AnalyticsService._views(model, using, q_object & partition)
+                .values(group_field)
+                .annotate(
+                    y=Count('blog_id', distinct=True),
+                    z=Sum('count')
+                )
+                .order_by('-z')
+            )
+            if not sharded:
+                top_qs = top_qs[:10]
+            QueryGuard.check_queryset(top_qs, filters_config)
+            return list(top_qs)
+        
+        merged = {}
+        for rows in AnalyticsService._scatter(compute):
+            for item in rows:
+                entry = merged.setdefault(item[group_field], [0, 0])
+                entry[0] += item['y']
+                entry[1] += item['z']
+        top = sorted(merged.items(), key=lambda item: -item[1][1])[:10]
+        
+        labels = AnalyticsService._group_labels(group_field, {group for group, _ in top})
+        return [
+            (labels.get(group), number_of_blogs, total_views)
+            for group, (number_of_blogs, total_views) in top
+        ]
+    
+    @staticmethod
+    def sample_info():
+        """Describes the sample behind ``approx`` results, or None when sampling is off."""
+        if not ViewSampler.rate():
+            return None
+        return {'sample_rate': ViewSampler.rate(), 'confidence': 0.95}
+    
+    @staticmethod
+    def _approx_blog_views(group_field, date_trunc, start_day, filters_config):
+        q_object = AnalyticsService._view_filter_q(filters_config)
+        q_object &= Q(viewed_at__gte=AnalyticsService._day_start(start_day))
+        estimates = AnalyticsService._estimate(q_object, ['period', group_field], date_trunc, filters_config)
+        
+        labels = AnalyticsService._group_labels(
+            group_field, {group for _, group in estimates}
+        )
+        rows = sorted(
+            (period, labels.get(group), estimate)
+            for (period, group), estimate in estimates.items()
+        )
+        return [dict(x=label, **estimate) for period, label, estimate in rows]
+    
+    @staticmethod
+    def _approx_top(top_type, q_object, filters_config):
+        if top_type == 'blog':
+            estimates = AnalyticsService._estimate(q_object, ['blog_id'], filters_config=filters_config)
+            top = sorted(estimates.items(), key=lambda item: -item[1]['z'])[:10]
+            blogs = Blog.objects.select_related('author').in_bulk([blog_id for (blog_id,), _ in top])
+            return [
+                {
+                    'blog_id': blog_id,
+                    'blog__title': blogs[blog_id].title,
+                    'blog__author__username': blogs[blog_id].author.username,
+                    'x': blogs[blog_id].title,
+                    'y': blog_id,
+                    'z': estimate['z'],
+                    'z_ci': estimate['z_ci'],
+                }
+                for (blog_id,), estimate in top
+            ]
+        
+        group_field, label_key = {
+            'user': ('author_id', 'blog__author__username'),
+            'country': ('country_id', 'blog__author__country__name'),
+        }[top_type]
+        estimates = AnalyticsService._estimate(q_object, [group_field], filters_config=filters_config)
+        top = sorted(estimates.items(), key=lambda item: -item[1]['z'])[:10]
+        labels = AnalyticsService._group_labels(group_field, {group for (group,), _ in top})
+        return [
+            dict({label_key: labels.get(group), 'x': labels.get(group)}, **estimate)
+            for (group,), estimate in top
+        ]
+    
+    @staticmethod
+    def _estimate(q_object, group_fields, date_trunc=None, filters_config=None):
+        """
+        Horvitz-Thompson estimates from ``BlogViewSample`` per group.
+
+        Returns ``{group values: {'y', 'y_ci', 'z', 'z_ci'}}`` with ``z`` the
+        estimated views and ``y`` the estimated number of distinct blogs, each
+        with a 95% normal confidence interval. A blog with ``n`` views is seen
+        with probability ``1 - (1 - p)**n``, which weights the blog count.
+        """
+        sample = BlogViewSample.objects.filter(q_object)
+        if date_trunc:
+            sample = sample.annotate(period=Trunc('viewed_at', date_trunc))
+        rows = (
+            sample
+            .values(*group_fields, 'blog_id')
             .annotate(
-                x=F('blog__author__country__name'),
-                y=Count('blog_id', distinct=True),
-                z=Sum('count')
+                sampled=Sum('count'),
+                views=Sum(F('count') * F('weight')),
+                variance=Sum(F('count') * F('weight') * (F('weight') - 1)),
             )
-            .order_by('-z')[:10]
+            .order_by()
         )
+        QueryGuard.check_queryset(rows, filters_config)
+        
+        totals = {}
+        for item in rows:
+            group = tuple(item[field] for field in group_fields)
+            if date_trunc:
+                group = (item['period'].date(),) + group[1:]
+            entry = totals.setdefault(group, [0, 0.0, 0.0, 0, 0.0, 0.0])
+            rate = item['sampled'] / item['views']
+            seen = 1 - (1 - rate) ** item['views'] if rate < 1 else 1.0
+            entry[0] += item['sampled']
+            entry[1] += item['views']
+            entry[2] += item['variance']
+            entry[3] += 1
+            entry[4] += 1 / seen
+            entry[5] += (1 - seen) / seen ** 2
+        
+        def interval(estimate, variance, floor):
+            margin = 1.96 * math.sqrt(variance)
+            return [max(floor, round(estimate - margin)), round(estimate + margin)]
+        
+        return {
+            group: {
+                'y': round(blogs),
+                'y_ci': interval(blogs, blogs_variance, seen_blogs),
+                'z': round(views),
+                'z_ci': interval(views, views_variance, sampled),
+            }
+            for group, (sampled, views, views_variance, seen_blogs, blogs, blogs_variance) in totals.items()
+        }
     
     @staticmethod
+    @budgeted
     def get_performance_analytics(compare, user_id=None, filters_config=None):
      
-        base_qs = BlogView.objects.select_related('blog')
+        q_object = AnalyticsService._view_filter_q(filters_config)
         
         if user_id:
-            base_qs = base_qs.filter(blog__author_id=user_id)
-        
-        if filters_config:
-            q_object = DynamicFilter.build_q_object(filters_config)
-            base_qs = base_qs.filter(q_object)
+            q_object &= Q(author_id=user_id)
         
         date_trunc = AnalyticsService._get_date_trunc(compare)
         
-   
-        performance_data = (
-            base_qs
-            .annotate(period=Trunc('viewed_at', date_trunc))
-            .values('period')
-            .annotate(
-                number_of_blogs=Count('blog_id', distinct=True),
-                views=Sum('count'),
+        def compute(model, using, partition):
+            performance_qs = (
+                AnalyticsService._views(model, using, q_object & partition)
+                .annotate(period=Trunc('viewed_at', date_trunc))
+                .values('period')
+                .annotate(views=Sum('count'))
+                .order_by('period')
             )
-            .annotate(
-                previous_views=Window(
-                    expression=Lag('views'),
-                    partition_by=[],
-                    order_by=F('period').asc(),
+            QueryGuard.check_queryset(performance_qs, filters_config)
+            return list(performance_qs)
+        
+        # Sums add up across shards and time partitions alike.
+        partitions = None
+        if AnalyticsService._parallel_workers():
+            first_day, last_day = AnalyticsService._view_bounds(q_object)
+            if first_day is not None:
+                partitions = AnalyticsService._partition_window(
+                    first_day, last_day + timedelta(days=1)
+                )
+        views_by_period = {}
+        for rows in AnalyticsService._scatter(compute, partitions, 'performance'):
+            for item in rows:
+                views_by_period[item['period']] = (
+                    views_by_period.get(item['period'], 0) + (item['views'] or 0)
                 )
-            )
-            .order_by('period')
-        )
         
      
         blog_qs = Blog.objects.all()
@@ -169,11 +1132,10 @@ class AnalyticsService:
         
         
         result = []
-        for item in performance_data:
-            period = item['period']
+        previous_views = 0
+        for period in sorted(views_by_period):
             blogs_created = blogs_dict.get(period, 0)
-            current_views = item['views'] or 0
-            previous_views = item['previous_views'] or 0
+            current_views = views_by_period[period]
             
             if previous_views > 0:
                 growth_pct = ((current_views - previous_views) / previous_views) * 100
@@ -199,6 +1161,7 @@ class AnalyticsService:
                 'y': current_views,
                 'z': round(growth_pct, 2)
             })
+            previous_views = current_views
         
         return result
     
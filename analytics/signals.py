@@ -0,0 +1,100 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Blog, BlogView, BlogViewSample, Country, ShardedBlogView, User
+from .routers import shard_for_blog, view_shards
+from .services import AnalyticsService
+
+
+@receiver(post_save, sender=Blog)
+def sync_blog_view_author(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    country_id = (
+        User.objects.filter(pk=instance.author_id)
+        .values_list('country_id', flat=True)
+        .first()
+    )
+    updated = (
+        BlogView.objects
+        .filter(blog=instance)
+        .exclude(author_id=instance.author_id, country_id=country_id)
+        .update(author_id=instance.author_id, country_id=country_id)
+    )
+    BlogViewSample.objects.filter(blog=instance).update(
+        author_id=instance.author_id, country_id=country_id
+    )
+    if view_shards():
+        updated += (
+            ShardedBlogView.objects
+            .using(shard_for_blog(instance.pk))
+            .filter(blog_id=instance.pk)
+            .exclude(author_id=instance.author_id, country_id=country_id)
+            .update(author_id=instance.author_id, country_id=country_id)
+        )
+    if updated:
+        AnalyticsService.invalidate_all_buckets()
+
+
+@receiver(post_save, sender=User)
+def sync_blog_view_country(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    updated = (
+        BlogView.objects
+        .filter(author=instance)
+        .exclude(country_id=instance.country_id)
+        .update(country_id=instance.country_id)
+    )
+    BlogViewSample.objects.filter(author=instance).update(country_id=instance.country_id)
+    for alias in view_shards():
+        updated += (
+            ShardedBlogView.objects
+            .using(alias)
+            .filter(author_id=instance.pk)
+            .exclude(country_id=instance.country_id)
+            .update(country_id=instance.country_id)
+        )
+    if updated:
+        AnalyticsService.invalidate_all_buckets()
+
+
+@receiver(post_delete, sender=Blog)
+def delete_sharded_blog_views(sender, instance, **kwargs):
+    # Shard rows have no database-level foreign keys, so nothing cascades.
+    if view_shards():
+        ShardedBlogView.objects.using(shard_for_blog(instance.pk)).filter(blog_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=User)
+def delete_sharded_author_views(sender, instance, **kwargs):
+    for alias in view_shards():
+        ShardedBlogView.objects.using(alias).filter(author_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Country)
+def delete_sharded_country_views(sender, instance, **kwargs):
+    for alias in view_shards():
+        ShardedBlogView.objects.using(alias).filter(country_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Blog)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Country)
+def invalidate_buckets_on_delete(sender, **kwargs):
+    # Cached buckets may still hold the deleted rows' views and group ids.
+    AnalyticsService.invalidate_all_buckets()
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def invalidate_blog_sets(sender, created=False, **kwargs):
+    # A new user or country has no blogs yet, and cached sets pick up new
+    # blogs by themselves.
+    if not created:
+        AnalyticsService.invalidate_blog_sets()
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.utils import timezone
+from analytics.models import Blog, BlogView, Country, ShardedBlogView, User
+from analytics.routers import shard_for_blog, view_shards
+
+
+class AnalyticsTestCase(TransactionTestCase):
+    # Sharded and partitioned queries run on worker threads with their own
+    # connections, which would not see data inside a TestCase transaction.
+    databases = '__all__'
+
+    def setUp(self):
+        # Buckets, blog id sets and versions live in the process-wide cache.
+        cache.clear()
+        self.country = Country.objects.create(name='Testland')
+
+    def make_blog(self, username, country=None, title='Post'):
+        author, _ = User.objects.get_or_create(
+            username=username, defaults={'country': country or self.country}
+        )
+        return Blog.objects.create(title=title, author=author)
+
+    def add_views(self, blog, days_ago, count):
+        """``count`` views of ``blog`` in one hour ``days_ago`` days back."""
+        return self.add_views_at(blog, timezone.now() - timedelta(days=days_ago), count)
+
+    def add_views_at(self, blog, when, count):
+        hour = when.replace(minute=0, second=0, microsecond=0)
+        if view_shards():
+            ShardedBlogView.objects.using(shard_for_blog(blog.pk)).create(
+                blog_id=blog.pk,
+                author_id=blog.author_id,
+                country_id=blog.author.country_id,
+                viewed_at=when,
+                hour_bucket=hour,
+                count=count,
+            )
+        else:
+            view = BlogView.objects.create(blog=blog, count=count, hour_bucket=hour)
+            # viewed_at is auto_now_add.
+            BlogView.objects.filter(pk=view.pk).update(viewed_at=when)
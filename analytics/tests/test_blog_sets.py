@@ -0,0 +1,59 @@
+import sqlite3
+
+from django.db import connections, router
+from django.test import override_settings
+from analytics.models import Country, User
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+PYTHON = {'eq': {'blog__title__icontains': 'Python'}}
+
+
+class BlogIdSetTests(AnalyticsTestCase):
+
+    def test_new_blogs_join_cached_sets_without_invalidating(self):
+        first = self.make_blog('alice', title='Python tips')
+        self.assertEqual(list(AnalyticsService.get_matching_blog_ids(PYTHON)), [first.pk])
+        version = AnalyticsService._blog_set_version()
+
+        second = self.make_blog('bob', title='More Python')
+        self.make_blog('carol', title='Go notes')
+        User.objects.create(username='dave', country=self.country)
+        Country.objects.create(name='Elsewhere')
+
+        self.assertEqual(AnalyticsService._blog_set_version(), version)
+        self.assertEqual(list(AnalyticsService.get_matching_blog_ids(PYTHON)), [first.pk, second.pk])
+
+    def test_editing_a_blog_invalidates_sets(self):
+        blog = self.make_blog('alice', title='Python tips')
+        self.assertEqual(list(AnalyticsService.get_matching_blog_ids(PYTHON)), [blog.pk])
+
+        blog.title = 'Go tips'
+        blog.save()
+        self.assertEqual(list(AnalyticsService.get_matching_blog_ids(PYTHON)), [])
+
+    def test_id_lists_longer_than_the_parameter_limit(self):
+        blog = self.make_blog('alice')
+        self.add_views(blog, 1, 5)
+        blog_ids = list(range(1, 40000))
+        for model, using in AnalyticsService._view_sources():
+            # Some builds raise SQLite's default limit of 32766.
+            connection = connections[using or router.db_for_read(model)]
+            connection.ensure_connection()
+            connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+
+        matching = sum(
+            AnalyticsService._views(model, using, AnalyticsService._blog_id_in(blog_ids)).count()
+            for model, using in AnalyticsService._view_sources()
+        )
+        self.assertEqual(matching, 1)
+
+    @override_settings(ANALYTICS_BLOG_ID_SET_MAX_INLINE=1)
+    def test_sets_over_the_inline_limit(self):
+        for username in ['alice', 'bob', 'carol']:
+            self.add_views(self.make_blog(username, title=f'Python by {username}'), 1, 2)
+        self.add_views(self.make_blog('dave', title='Go'), 1, 2)
+
+        for filters, expected in ((PYTHON, 3), ({'not': PYTHON}, 1)):
+            rows = AnalyticsService.get_top_analytics('blog', filters)
+            self.assertEqual(len(rows), expected)
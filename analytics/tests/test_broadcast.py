@@ -0,0 +1,35 @@
+from unittest import mock
+
+from django.test import override_settings
+from analytics.broadcast import ViewBroadcaster
+from analytics.guards import QueryBudgetExceeded
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+
+@override_settings(ANALYTICS_LIVE_INTERVAL=0)
+class ViewBroadcasterTests(AnalyticsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.broadcaster = ViewBroadcaster()
+
+    def test_subscribers_see_published_views(self):
+        blog = self.make_blog('alice')
+        self.add_views(blog, 1, 5)
+        seq = self.broadcaster.subscribe()
+        self.assertEqual(self.broadcaster.top(), [(blog.pk, 5)])
+
+        self.broadcaster.publish(blog.pk, 2)
+        seq, deltas, top = self.broadcaster.changes_since(seq)
+        self.assertEqual(deltas, {blog.pk: 2})
+        self.assertEqual(top, [(blog.pk, 7)])
+
+    def test_failed_seeding_leaves_no_subscriber(self):
+        with mock.patch.object(AnalyticsService, 'get_blog_totals', side_effect=QueryBudgetExceeded('slow')):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.broadcaster.subscribe()
+
+        self.assertEqual(self.broadcaster._subscribers, 0)
+        self.broadcaster.publish(1)
+        self.assertEqual(self.broadcaster._batch, {})
@@ -0,0 +1,119 @@
+import threading
+from concurrent.futures import wait
+from datetime import date
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from analytics.guards import QueryBudgetExceeded
+from analytics.models import BucketGeneration, User
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+
+class SealedBucketTests(AnalyticsTestCase):
+
+    def totals(self):
+        rows = AnalyticsService.get_blog_views_analytics('user', 'month')
+        totals = {}
+        for row in rows:
+            totals[row['x']] = totals.get(row['x'], 0) + row['z']
+        return totals
+
+    def test_past_days_are_served_from_cache(self):
+        blog = self.make_blog('alice')
+        self.add_views(blog, 3, 5)
+        self.assertEqual(self.totals(), {'alice': 5})
+
+        self.add_views(blog, 4, 7)
+        self.assertEqual(self.totals(), {'alice': 5})
+
+        AnalyticsService.invalidate_all_buckets()
+        self.assertEqual(self.totals(), {'alice': 12})
+
+    def test_deleting_user_invalidates_buckets(self):
+        self.add_views(self.make_blog('alice'), 3, 5)
+        self.add_views(self.make_blog('bob'), 3, 2)
+        self.assertEqual(self.totals(), {'alice': 5, 'bob': 2})
+
+        User.objects.get(username='bob').delete()
+        self.assertEqual(self.totals(), {'alice': 5})
+
+    def test_deleting_blog_invalidates_filtered_buckets(self):
+        blog = self.make_blog('alice', title='Python tips')
+        self.add_views(blog, 3, 5)
+        filters = {'eq': {'blog__title__icontains': 'Python'}}
+        self.assertEqual(len(AnalyticsService.get_blog_views_analytics('user', 'month', filters)), 1)
+
+        blog.delete()
+        self.assertEqual(AnalyticsService.get_blog_views_analytics('user', 'month', filters), [])
+
+    @override_settings(ANALYTICS_BUCKET_TIMEOUT=0)
+    def test_buckets_expire(self):
+        blog = self.make_blog('alice')
+        self.add_views(blog, 3, 5)
+        self.totals()
+
+        self.add_views(blog, 4, 7)
+        self.assertEqual(self.totals(), {'alice': 12})
+
+    def test_days_are_sealed_per_month(self):
+        days = [date(2026, 1, 30), date(2026, 1, 31), date(2026, 2, 1), date(2026, 2, 3)]
+        self.assertEqual(AnalyticsService._seal_chunks(days), [
+            [date(2026, 1, 30), date(2026, 1, 31)],
+            [date(2026, 2, 1)],
+            [date(2026, 2, 3)],
+        ])
+
+    @override_settings(ANALYTICS_BUCKET_TIMEOUT=1000)
+    def test_bucket_timeouts_are_staggered(self):
+        timeouts = {AnalyticsService._bucket_timeout() for _ in range(50)}
+        self.assertTrue(all(1000 <= timeout <= 1500 for timeout in timeouts))
+        self.assertGreater(len(timeouts), 1)
+
+    def test_cold_sealing_continues_after_the_request_gives_up(self):
+        self.add_views(self.make_blog('alice'), 3, 5)
+        release = threading.Event()
+        compute = AnalyticsService._compute_buckets
+
+        def slow_compute(*args):
+            release.wait(5)
+            return compute(*args)
+
+        with mock.patch.object(AnalyticsService, '_compute_buckets', side_effect=slow_compute) as patched:
+            with override_settings(ANALYTICS_QUERY_TIMEOUT=0.1):
+                with self.assertRaises(QueryBudgetExceeded) as raised:
+                    self.totals()
+            self.assertEqual(raised.exception.status_code, 503)
+            sealing = list(AnalyticsService._sealing.values())
+            self.assertTrue(sealing)
+            release.set()
+            wait(sealing)
+            calls = patched.call_count
+
+            self.assertEqual(self.totals(), {'alice': 5})
+            # Only today's bucket was aggregated; every past day was cached.
+            self.assertEqual(patched.call_count, calls + 1)
+
+    def test_generation_is_shared_through_the_database(self):
+        blog = self.make_blog('alice')
+        self.add_views(blog, 3, 5)
+        self.totals()
+        self.add_views(blog, 4, 7)
+
+        # Another process, e.g. a management command, bumps the generation.
+        BucketGeneration.objects.update_or_create(pk=1, defaults={'value': 5})
+        self.assertEqual(self.totals(), {'alice': 12})
+
+    def test_groups_without_label_are_merged(self):
+        alice = self.make_blog('alice').author_id
+        day = timezone.localdate().replace(day=1)
+        buckets = {day: [(alice, 1, 3), (-1, 2, 4), (-2, 3, 4)], date(day.year, day.month, 2): [(-1, 2, 1)]}
+
+        rows = AnalyticsService._merge_buckets(buckets, 'month', 'author_id')
+
+        self.assertEqual(rows, [
+            {'x': None, 'y': 1, 'z': 4},
+            {'x': None, 'y': 1, 'z': 5},
+            {'x': 'alice', 'y': 1, 'z': 3},
+        ])
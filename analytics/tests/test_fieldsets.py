@@ -0,0 +1,44 @@
+from analytics.models import Blog, User
+from analytics.serializers import BlogSerializer, UserSerializer
+from .base import AnalyticsTestCase
+
+
+class SparseFieldsTests(AnalyticsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blog = self.make_blog('alice', title='Python tips')
+        self.make_blog('bob', title='Go notes')
+
+    def test_lists_match_the_serializers(self):
+        users = self.client.get('/api/users/').json()
+        blogs = self.client.get('/api/blogs/').json()
+
+        self.assertCountEqual(users, UserSerializer(User.objects.all(), many=True).data)
+        self.assertCountEqual(blogs, BlogSerializer(Blog.objects.all(), many=True).data)
+
+    def test_lists_keep_only_requested_fields(self):
+        rows = self.client.get('/api/blogs/', {'fields': 'title,author_name'}).json()
+
+        self.assertCountEqual(rows, [
+            {'title': 'Python tips', 'author_name': 'alice'},
+            {'title': 'Go notes', 'author_name': 'bob'},
+        ])
+
+    def test_detail_drops_fields_not_requested(self):
+        row = self.client.get(f'/api/blogs/{self.blog.pk}/', {'fields': 'id,title'}).json()
+
+        self.assertEqual(row, {'id': self.blog.pk, 'title': 'Python tips'})
+
+    def test_blog_views_fields(self):
+        self.add_views(self.blog, 1, 5)
+
+        rows = self.client.get('/api/blog-views/', {'blog': self.blog.pk, 'fields': 'blog_title,count'}).json()
+
+        self.assertEqual(rows, [{'blog_title': 'Python tips', 'count': 5}])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/users/', {'fields': 'id,password'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['fields'][0])
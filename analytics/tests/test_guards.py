@@ -0,0 +1,57 @@
+import json
+
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test import override_settings
+from analytics.guards import QueryBudgetExceeded, QueryGuard
+from analytics.models import Blog
+from .base import AnalyticsTestCase
+
+SLOW_SQL = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) "
+    "SELECT COUNT(*) FROM n"
+)
+
+
+class QueryGuardTests(AnalyticsTestCase):
+
+    def blog_views(self, filters):
+        return self.client.get('/api/analytics/blog-views/', {
+            'object_type': 'user', 'range': 'week', 'filters': json.dumps(filters),
+        })
+
+    def test_large_filter_trees_are_rejected(self):
+        wide = {'or': [{'eq': {'blog__title': f'Post {index}'}} for index in range(70)]}
+        deep = {'eq': {'blog__title': 'Post'}}
+        for _ in range(9):
+            deep = {'not': deep}
+
+        for filters in (wide, deep):
+            response = self.blog_views(filters)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('at most', response.json()['error'])
+
+    def test_expensive_queries_are_rejected_before_running(self):
+        self.add_views(self.make_blog('alice'), 1, 5)
+
+        with override_settings(ANALYTICS_MAX_QUERY_COST=0):
+            response = self.client.get('/api/analytics/top/', {'top': 'user'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('/analytics/jobs/', response.json()['error'])
+
+    def test_sort_passes_are_charged_to_the_scan(self):
+        for index in range(20):
+            self.make_blog(f'user{index}', title=f'Post {index}')
+        rows = QueryGuard._table_rows(connection, Blog._meta.db_table)
+
+        self.assertEqual(QueryGuard.estimate_cost(Blog.objects.all()), rows)
+        self.assertEqual(QueryGuard.estimate_cost(Blog.objects.order_by(Lower('title'))), rows + rows // 10)
+        self.assertEqual(QueryGuard.estimate_cost(Blog.objects.all(), filter_nodes=2), rows * 3)
+
+    def test_statements_past_the_budget_are_interrupted(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with QueryGuard.execution_budget(0.05), connection.cursor() as cursor:
+                cursor.execute(SLOW_SQL)
+
+        self.assertEqual(raised.exception.status_code, 503)
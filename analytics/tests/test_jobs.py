@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from analytics.jobs import JobRunner
+from analytics.models import AnalyticsJob
+from analytics.serializers import PerformanceAnalyticsSerializer, TopAnalyticsSerializer
+from .base import AnalyticsTestCase
+
+
+class AnalyticsJobTests(AnalyticsTestCase):
+
+    def store(self, kind, serializer_class, params, age):
+        """A finished job for ``params`` with a marker result, ``age`` seconds old."""
+        serializer = serializer_class(data=params)
+        serializer.is_valid(raise_exception=True)
+        spec = JobRunner.spec(kind, serializer.validated_data, None)
+        return AnalyticsJob.objects.create(
+            kind=kind,
+            spec=spec,
+            spec_hash=JobRunner.spec_hash(spec),
+            client='test',
+            status=AnalyticsJob.DONE,
+            result={'data': 'stored'},
+            finished_at=timezone.now() - timedelta(seconds=age),
+        )
+
+    def test_job_runs_and_is_reused(self):
+        self.add_views(self.make_blog('alice'), 3, 5)
+        body = {'kind': 'top', 'params': {'top': 'user'}}
+
+        submitted = self.client.post('/api/analytics/jobs/', body, content_type='application/json')
+        self.assertEqual(submitted.status_code, 202)
+
+        job = self.client.get(submitted.json()['url'], {'wait': 5}).json()
+        self.assertEqual(job['status'], AnalyticsJob.DONE)
+        self.assertEqual(job['result']['data'][0]['x'], 'alice')
+
+        again = self.client.post('/api/analytics/jobs/', body, content_type='application/json')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['id'], job['id'])
+
+    def test_wait_must_be_a_finite_number(self):
+        job = self.store('top', TopAnalyticsSerializer, {'top': 'user'}, 0)
+        for wait in ('soon', 'nan', 'inf', '-inf'):
+            response = self.client.get(f'/api/analytics/jobs/{job.pk}/', {'wait': wait})
+            self.assertEqual(response.status_code, 400, wait)
+
+    def test_sync_endpoints_reuse_results_within_their_cache_timeout(self):
+        self.store('top', TopAnalyticsSerializer, {'top': 'user'}, 5 * 60)
+        self.store('performance', PerformanceAnalyticsSerializer, {'compare': 'month'}, 5 * 60)
+
+        # Top is cached for 10 minutes, performance for 2.
+        top = self.client.get('/api/analytics/top/', {'top': 'user'}).json()
+        performance = self.client.get('/api/analytics/performance/', {'compare': 'month'}).json()
+        self.assertEqual(top['data'], 'stored')
+        self.assertNotEqual(performance['data'], 'stored')
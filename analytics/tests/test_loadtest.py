@@ -0,0 +1,18 @@
+from django.test import SimpleTestCase
+from analytics.management.commands.loadtest import percentile
+
+
+class PercentileTests(SimpleTestCase):
+
+    def test_nearest_rank(self):
+        values = list(range(1, 21))
+        self.assertEqual(percentile(values, 50), 10)
+        self.assertEqual(percentile(values, 95), 19)
+        self.assertEqual(percentile(values, 99), 20)
+        self.assertEqual(percentile(values, 100), 20)
+        self.assertEqual(percentile(values, 0), 1)
+
+    def test_small_samples(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([1, 2, 3, 4], 75), 3)
@@ -0,0 +1,90 @@
+import json
+from unittest import mock
+
+from django.test import Client
+from django.utils import timezone
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+
+class BlogViewsPageTests(AnalyticsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Today, and the last day of the previous week: two weekly periods.
+        last_week = timezone.localdate().weekday() + 1
+        for index, username in enumerate(['alice', 'bob', 'carol']):
+            blog = self.make_blog(username)
+            self.add_views(blog, 0, 10 + index)
+            self.add_views(blog, last_week, 20 - index)
+        self.client = Client()
+
+    def get(self, **params):
+        return self.client.get('/api/analytics/blog-views/', {'object_type': 'user', 'range': 'week', **params})
+
+    def test_pages_cover_the_full_result(self):
+        rows, cursor = [], None
+        while True:
+            page = AnalyticsService.get_blog_views_page(
+                'user', 'week', page_size=2,
+                cursor=cursor and AnalyticsService.decode_cursor(cursor),
+            )
+            self.assertLessEqual(len(page['data']), 2)
+            rows += page['data']
+            cursor = page['next']
+            if not cursor:
+                break
+
+        self.assertEqual(len(rows), 6)
+        periods = [row['period'] for row in rows]
+        self.assertEqual(periods, sorted(periods))
+        full = AnalyticsService.get_blog_views_analytics('user', 'week')
+        self.assertCountEqual(
+            [(row['x'], row['z']) for row in rows],
+            [(row['x'], row['z']) for row in full],
+        )
+
+    def test_page_only_ranks_the_periods_it_needs(self):
+        source = '_rank_merged_period' if len(AnalyticsService._view_sources()) > 1 else '_rank_period'
+        rank = getattr(AnalyticsService, source)
+        with mock.patch.object(AnalyticsService, source, side_effect=rank) as ranked:
+            first = AnalyticsService.get_blog_views_page('user', 'week', page_size=2)
+            self.assertEqual(ranked.call_count, 1)
+            self.assertEqual(ranked.call_args.args[-2:], (0, 3))
+
+            AnalyticsService.get_blog_views_page(
+                'user', 'week', page_size=2, cursor=AnalyticsService.decode_cursor(first['next']),
+            )
+            # Resumes after rank 2 of the first period, then the second.
+            self.assertEqual(ranked.call_count, 3)
+            self.assertEqual(ranked.call_args_list[1].args[-2:], (2, 3))
+            self.assertEqual(ranked.call_args_list[2].args[-2:], (0, 2))
+
+    def test_limit_keeps_top_groups_per_period(self):
+        response = self.get(limit=1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['x'], row['z']) for row in response.json()['data']],
+            [('alice', 20), ('carol', 12)],
+        )
+        self.assertIsNone(response.json()['next'])
+
+    def test_cursor_over_http(self):
+        first = self.get(page_size=4).json()
+        second = self.get(page_size=4, cursor=first['next']).json()
+
+        self.assertEqual(len(first['data']), 4)
+        self.assertEqual(len(second['data']), 2)
+        self.assertIsNone(second['next'])
+
+    def test_filter_matching_no_blogs_gives_empty_page(self):
+        filters = json.dumps({'eq': {'blog__author__country__name': 'Nowhere'}})
+        response = self.get(limit=3, filters=filters)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'data': [], 'next': None})
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.get(page_size=2, cursor='not-a-cursor').status_code, 400)
+        self.assertEqual(self.get(cursor=AnalyticsService.encode_cursor('2026-01-01', 1)).status_code, 400)
@@ -0,0 +1,54 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.test import override_settings
+from analytics import instrumentation
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+
+class PartitionedQueryTests(AnalyticsTestCase):
+
+    def test_bounds_follow_the_calendar(self):
+        self.assertEqual(AnalyticsService._split_bounds(date(2026, 1, 20), date(2026, 3, 5), 'month'), [
+            (date(2026, 1, 20), date(2026, 2, 1)),
+            (date(2026, 2, 1), date(2026, 3, 1)),
+            (date(2026, 3, 1), date(2026, 3, 5)),
+        ])
+        self.assertEqual(AnalyticsService._split_bounds(date(2026, 1, 7), date(2026, 1, 20), 'week'), [
+            (date(2026, 1, 7), date(2026, 1, 12)),
+            (date(2026, 1, 12), date(2026, 1, 19)),
+            (date(2026, 1, 19), date(2026, 1, 20)),
+        ])
+
+    @override_settings(ANALYTICS_PARALLEL_WORKERS=2)
+    def test_short_windows_are_not_split(self):
+        self.assertIsNone(AnalyticsService._partition_window(date(2026, 1, 1), date(2026, 1, 20)))
+        # Twelve months would be more than four partitions per worker.
+        split, partitions = AnalyticsService._partition_window(date(2025, 1, 1), date(2026, 1, 1))
+        self.assertEqual((split, len(partitions)), ('quarter', 4))
+
+    def test_partitions_merge_to_the_serial_result(self):
+        alice = self.make_blog('alice')
+        for days_ago, count in ((10, 1), (100, 2), (200, 3), (300, 4)):
+            self.add_views(alice, days_ago, count)
+        self.add_views(self.make_blog('bob'), 50, 5)
+
+        def results():
+            cache.clear()
+            return (
+                AnalyticsService.get_blog_views_analytics('user', 'year'),
+                AnalyticsService.get_performance_analytics('month'),
+            )
+
+        serial = results()
+        with override_settings(ANALYTICS_PARALLEL_WORKERS=2, ANALYTICS_PARTITION_SPLIT='month'):
+            parallel = results()
+
+        self.assertEqual(parallel, serial)
+        # alice's views span many partitions but she has one blog.
+        self.assertTrue(all(row['y'] == 1 for row in parallel[0]))
+        event = instrumentation.recent('parallel_query')[0]
+        self.assertEqual(event['split'], 'month')
+        self.assertGreater(event['partitions'], 1)
+        self.assertIn('speedup', event)
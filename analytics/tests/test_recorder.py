@@ -0,0 +1,51 @@
+import unittest
+from datetime import timedelta
+
+from django.db.models import Q
+from django.test import override_settings
+from django.utils import timezone
+from analytics.models import BlogView
+from analytics.recorder import ViewRecorder
+from analytics.routers import view_shards
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+
+class ViewRecorderTests(AnalyticsTestCase):
+
+    def rows(self, blog):
+        rows = []
+        for model, using in AnalyticsService._view_sources():
+            rows += AnalyticsService._views(model, using, Q(blog_id=blog.pk)).order_by('hour_bucket').values(
+                'hour_bucket', 'count', 'author_id', 'country_id'
+            )
+        return rows
+
+    def test_views_are_counted_per_hour(self):
+        blog = self.make_blog('alice')
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        for minute in (1, 20, 59):
+            ViewRecorder.record(blog, hour + timedelta(minutes=minute))
+        ViewRecorder.record(blog, hour + timedelta(hours=1))
+
+        self.assertEqual(
+            [(row['hour_bucket'], row['count']) for row in self.rows(blog)],
+            [(hour, 3), (hour + timedelta(hours=1), 1)],
+        )
+
+    def test_retrieving_a_blog_records_a_view(self):
+        blog = self.make_blog('alice')
+
+        self.client.get(f'/api/blogs/{blog.pk}/')
+        self.client.get(f'/api/blogs/{blog.pk}/')
+
+        self.assertEqual(sum(row['count'] for row in self.rows(blog)), 2)
+
+    @unittest.skipIf(view_shards(), "legacy storage is not used with shards")
+    @override_settings(ANALYTICS_VIEW_STORAGE='legacy')
+    def test_legacy_storage_keeps_one_row_per_blog(self):
+        blog = self.make_blog('alice')
+        ViewRecorder.record(blog, timezone.now() - timedelta(days=2))
+        ViewRecorder.record(blog)
+
+        self.assertEqual(list(BlogView.objects.filter(blog=blog).values_list('count', flat=True)), [2])
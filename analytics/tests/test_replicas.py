@@ -0,0 +1,98 @@
+import time
+from unittest import mock
+
+from django.test import Client, override_settings
+from analytics.models import AnalyticsJob, Blog, BlogView
+from analytics.routers import ReadReplicaRouter, _replica_reads, primary_reads, replica_reads
+from analytics.services import AnalyticsService
+from analytics import middleware
+from .base import AnalyticsTestCase
+
+
+@override_settings(ANALYTICS_READ_REPLICAS=['replica_test'], ANALYTICS_REPLICA_MAX_LAG=30)
+class ReadReplicaRouterTests(AnalyticsTestCase):
+
+    router = ReadReplicaRouter()
+
+    def heartbeat(self, age):
+        return mock.patch.object(ReadReplicaRouter, 'heartbeat', return_value=time.time() - age)
+
+    def test_reads_go_to_fresh_replica_only_inside_replica_reads(self):
+        with self.heartbeat(1):
+            self.assertIsNone(self.router.db_for_read(Blog))
+            with replica_reads():
+                self.assertEqual(self.router.db_for_read(Blog), 'replica_test')
+                with primary_reads():
+                    self.assertIsNone(self.router.db_for_read(Blog))
+
+    def test_stale_replica_is_skipped(self):
+        with self.heartbeat(60), replica_reads():
+            self.assertIsNone(self.router.db_for_read(BlogView))
+
+    def test_recent_writer_stays_on_primary(self):
+        with self.heartbeat(5):
+            with replica_reads(written_at=time.time()):
+                self.assertIsNone(self.router.db_for_read(Blog))
+            with replica_reads(written_at=time.time() - 10):
+                self.assertEqual(self.router.db_for_read(Blog), 'replica_test')
+
+    def test_jobs_are_read_from_primary(self):
+        with self.heartbeat(1), replica_reads():
+            self.assertIsNone(self.router.db_for_read(AnalyticsJob))
+
+    def test_sealed_buckets_are_computed_on_primary(self):
+        self.add_views(self.make_blog('alice'), 3, 5)
+        routing = []
+        compute = AnalyticsService._compute_buckets
+
+        def record_routing(*args):
+            routing.append(_replica_reads.get())
+            return compute(*args)
+
+        with mock.patch.object(AnalyticsService, '_compute_buckets', side_effect=record_routing), \
+                mock.patch.object(ReadReplicaRouter, 'replica_is_usable', return_value=False), \
+                replica_reads():
+            AnalyticsService.get_blog_views_analytics('user', 'month')
+
+        # Sealed months first, then today's live bucket.
+        self.assertEqual(set(routing[:-1]), {None})
+        self.assertEqual(routing[-1], 0)
+
+
+@override_settings(ANALYTICS_READ_REPLICAS=['replica_test'])
+class ReplicaStickinessTests(AnalyticsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blog = self.make_blog('alice')
+        self.client = Client()
+        # No replica is usable, so every read still works on the test database.
+        patcher = mock.patch.object(ReadReplicaRouter, 'heartbeat', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_recording_get_sets_write_cookie(self):
+        response = self.client.get(f'/api/blogs/{self.blog.pk}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(middleware.WRITE_COOKIE, response.cookies)
+
+    def test_plain_reads_do_not_set_write_cookie(self):
+        response = self.client.get('/api/blogs/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(middleware.WRITE_COOKIE, response.cookies)
+
+    def test_rejected_recording_get_sets_no_cookie(self):
+        response = self.client.get(f'/api/blogs/{self.blog.pk}/', {'include': 'bogus'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(middleware.WRITE_COOKIE, response.cookies)
+
+    def test_cookie_pins_following_reads(self):
+        written_at = float(self.client.post(f'/api/blogs/{self.blog.pk}/record_view/').cookies[middleware.WRITE_COOKIE].value)
+
+        with mock.patch.object(middleware, 'replica_reads', wraps=replica_reads) as reads:
+            self.client.get('/api/blogs/')
+
+        reads.assert_called_once_with(written_at)
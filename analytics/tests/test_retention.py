@@ -0,0 +1,86 @@
+import glob
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from analytics.management.commands.apply_retention import ARCHIVE_FIELDS
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+
+class ApplyRetentionTests(AnalyticsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+        settings = override_settings(ANALYTICS_ARCHIVE_DIR=self.archive_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.blog = self.make_blog('alice')
+
+    def at(self, days_ago, hour):
+        return AnalyticsService._day_start(timezone.localdate() - timedelta(days=days_ago)) + timedelta(hours=hour)
+
+    def run_retention(self, **options):
+        call_command('apply_retention', stdout=StringIO(), **options)
+
+    def rows(self):
+        rows = []
+        for model, using in AnalyticsService._view_sources():
+            queryset = model.objects.using(using) if using else model.objects
+            rows += queryset.values(*ARCHIVE_FIELDS)
+        return sorted(rows, key=lambda row: row['id'])
+
+    def archived(self):
+        rows = []
+        for path in glob.glob(os.path.join(self.archive_dir, '*.jsonl.gz')):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                rows += [json.loads(line) for line in f]
+        return sorted(rows, key=lambda row: row['id'])
+
+    def test_compaction_keeps_totals_and_moves_months_to_their_first_day(self):
+        month_start = (timezone.localdate() - timedelta(days=100)).replace(day=1)
+        month_days = (timezone.localdate() - month_start).days
+        self.add_views_at(self.blog, self.at(month_days - 2, 1), 5)
+        self.add_views_at(self.blog, self.at(month_days - 10, 3), 6)
+        self.add_views_at(self.blog, self.at(10, 1), 3)
+        self.add_views_at(self.blog, self.at(10, 5), 4)
+
+        self.run_retention(daily_after=5, monthly_after=40)
+
+        self.assertEqual(
+            [(row['viewed_at'], row['count']) for row in self.rows()],
+            [(self.at(month_days, 0), 11), (self.at(10, 0), 7)],
+        )
+
+    def test_archive_holds_every_replaced_row(self):
+        self.add_views_at(self.blog, self.at(10, 1), 3)
+        self.add_views_at(self.blog, self.at(10, 5), 4)
+        original = [
+            json.loads(json.dumps(row, default=str)) for row in self.rows()
+        ]
+
+        self.run_retention(daily_after=5, monthly_after=40)
+
+        self.assertEqual(self.archived(), original)
+        self.assertEqual(sum(row['count'] for row in self.rows()), 7)
+
+    def test_purge_drops_cached_buckets(self):
+        self.add_views(self.blog, 10, 5)
+        self.add_views(self.blog, 2, 3)
+        rows = AnalyticsService.get_blog_views_analytics('user', 'month')
+        self.assertEqual(sum(row['z'] for row in rows), 8)
+
+        self.run_retention(daily_after=1, monthly_after=5, purge_after=5)
+
+        rows = AnalyticsService.get_blog_views_analytics('user', 'month')
+        self.assertEqual(sum(row['z'] for row in rows), 3)
+        self.assertEqual([row['count'] for row in self.archived()], [5])
@@ -0,0 +1,47 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from analytics.models import BlogViewSample
+from analytics.recorder import ViewRecorder
+from .base import AnalyticsTestCase
+
+
+class ApproximateModeTests(AnalyticsTestCase):
+
+    def top(self, **params):
+        return self.client.get('/api/analytics/top/', {'top': 'user', **params}).json()
+
+    @override_settings(ANALYTICS_SAMPLE_RATE=1)
+    def test_a_full_sample_matches_the_exact_result(self):
+        for username, views in (('alice', 3), ('bob', 2)):
+            blog = self.make_blog(username)
+            for _ in range(views):
+                ViewRecorder.record(blog)
+
+        approx = self.top(mode='approx')
+        exact = self.top()
+
+        self.assertEqual(approx['approx'], {'sample_rate': 1, 'confidence': 0.95})
+        self.assertEqual([(row['x'], row['z']) for row in approx['data']], [('alice', 3), ('bob', 2)])
+        self.assertEqual([(row['x'], row['z']) for row in exact['data']], [('alice', 3), ('bob', 2)])
+        self.assertTrue(all('z_ci' in row for row in approx['data']))
+
+    @override_settings(ANALYTICS_SAMPLE_RATE=0.5)
+    def test_rebuild_weights_rows_by_the_rate(self):
+        self.add_views(self.make_blog('alice'), 1, 1000)
+
+        call_command('rebuild_view_sample', seed=1, stdout=StringIO())
+
+        sample = BlogViewSample.objects.get()
+        self.assertEqual(sample.weight, 2)
+        self.assertAlmostEqual(sample.count * sample.weight, 1000, delta=150)
+
+    @override_settings(ANALYTICS_SAMPLE_RATE=0)
+    def test_approx_falls_back_to_exact_without_a_sample(self):
+        self.add_views(self.make_blog('alice'), 1, 4)
+
+        response = self.top(mode='approx')
+
+        self.assertIsNone(response['approx'])
+        self.assertEqual([(row['x'], row['z']) for row in response['data']], [('alice', 4)])
@@ -0,0 +1,81 @@
+import unittest
+
+from analytics.models import Blog, ShardedBlogView, User
+from analytics.routers import shard_for_blog, view_shards
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+
+@unittest.skipUnless(len(view_shards()) > 1, "run with ANALYTICS_SHARD_COUNT=2 or more")
+class ShardedViewTests(AnalyticsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.first = self.make_blog('alice', title='First')
+        self.second = self.make_blog('alice', title='Second')
+        self.other = self.make_blog('bob', title='Other')
+        # Consecutive blog ids land on different shards.
+        self.assertNotEqual(shard_for_blog(self.first.pk), shard_for_blog(self.second.pk))
+        self.add_views(self.first, 1, 5)
+        self.add_views(self.second, 2, 4)
+        self.add_views(self.other, 1, 3)
+
+    def shard_rows(self, **filters):
+        return sum(
+            ShardedBlogView.objects.using(alias).filter(**filters).count()
+            for alias in view_shards()
+        )
+
+    def test_groups_merge_across_shards(self):
+        top = AnalyticsService.get_top_analytics('user')
+
+        self.assertEqual(
+            [(row['x'], row['y'], row['z']) for row in top],
+            [('alice', 2, 9), ('bob', 1, 3)],
+        )
+        rows = AnalyticsService.get_blog_views_analytics('user', 'week')
+        self.assertEqual(sum(row['z'] for row in rows if row['x'] == 'alice'), 9)
+
+    def test_deleting_blog_deletes_its_shard_rows(self):
+        blog_id = self.first.pk
+        self.first.delete()
+
+        self.assertEqual(self.shard_rows(blog_id=blog_id), 0)
+        top = AnalyticsService.get_top_analytics('blog')
+        self.assertEqual([row['blog_id'] for row in top], [self.second.pk, self.other.pk])
+
+    def test_top_blogs_skip_blogs_missing_on_default(self):
+        Blog.objects.filter(pk=self.first.pk)._raw_delete('default')
+
+        top = AnalyticsService.get_top_analytics('blog')
+
+        self.assertNotIn(self.first.pk, [row['blog_id'] for row in top])
+
+    def test_deleting_user_deletes_rows_on_every_shard(self):
+        author_id = self.first.author_id
+        User.objects.get(pk=author_id).delete()
+
+        self.assertEqual(self.shard_rows(author_id=author_id), 0)
+        self.assertEqual(self.shard_rows(), 1)
+
+    def test_deleting_country_deletes_its_rows(self):
+        self.country.delete()
+
+        self.assertEqual(self.shard_rows(), 0)
+
+    def test_blog_views_endpoint_reads_the_shards(self):
+        rows = self.client.get('/api/blog-views/').json()
+        self.assertCountEqual(
+            [(row['blog'], row['blog_title'], row['count']) for row in rows],
+            [(self.first.pk, 'First', 5), (self.second.pk, 'Second', 4), (self.other.pk, 'Other', 3)],
+        )
+
+        rows = self.client.get('/api/blog-views/', {'blog': self.second.pk, 'fields': 'blog_title,count'}).json()
+        self.assertEqual(rows, [{'blog_title': 'Second', 'count': 4}])
+
+    def test_blog_view_lookup_needs_the_blog(self):
+        view = ShardedBlogView.objects.using(shard_for_blog(self.first.pk)).get(blog_id=self.first.pk)
+
+        self.assertEqual(self.client.get(f'/api/blog-views/{view.pk}/').status_code, 400)
+        response = self.client.get(f'/api/blog-views/{view.pk}/', {'blog': self.first.pk})
+        self.assertEqual(response.json()['count'], 5)
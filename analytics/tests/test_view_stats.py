@@ -0,0 +1,43 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from analytics.services import AnalyticsService
+from .base import AnalyticsTestCase
+
+
+class BlogViewStatsTests(AnalyticsTestCase):
+
+    def blogs(self, **params):
+        return self.client.get('/api/blogs/', params)
+
+    def test_totals_and_sparklines_are_embedded(self):
+        blog = self.make_blog('alice')
+        self.add_views(blog, 0, 2)
+        self.add_views(blog, 2, 3)
+        self.add_views(blog, 30, 4)
+
+        rows = self.blogs(include='total_views,sparkline', sparkline_days=3).json()
+
+        self.assertEqual(rows, [dict(rows[0], total_views=9, sparkline=[3, 0, 2])])
+
+    def test_queries_do_not_grow_with_the_page(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.blogs(include='total_views,sparkline').status_code, 200)
+            return len(queries)
+
+        for index in range(2):
+            self.add_views(self.make_blog(f'user{index}'), 1, 1)
+        few = count_queries()
+        for index in range(2, 10):
+            self.add_views(self.make_blog(f'user{index}'), 1, 1)
+
+        self.assertEqual(count_queries(), few)
+
+    def test_invalid_params_are_rejected_before_recording(self):
+        blog = self.make_blog('alice')
+
+        for params in ({'include': 'likes'}, {'sparkline_days': 365}):
+            response = self.client.get(f'/api/blogs/{blog.pk}/', params)
+            self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(AnalyticsService.get_blog_view_history([blog.pk])[blog.pk]['total_views'], 0)
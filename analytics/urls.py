@@ -4,6 +4,9 @@ from .views import (
     BlogViewsAnalyticsView,
     TopAnalyticsView,
     PerformanceAnalyticsView,
+    AnalyticsJobsView,
+    AnalyticsJobDetailView,
+    LiveViewsStreamView,
     UserViewSet,
     BlogViewSet,
     BlogViewViewSet
@@ -18,5 +21,8 @@ urlpatterns = [
     path('analytics/blog-views/', BlogViewsAnalyticsView.as_view(), name='blog-views-analytics'),
     path('analytics/top/', TopAnalyticsView.as_view(), name='top-analytics'),
     path('analytics/performance/', PerformanceAnalyticsView.as_view(), name='performance-analytics'),
+    path('analytics/jobs/', AnalyticsJobsView.as_view(), name='analytics-jobs'),
+    path('analytics/jobs/<uuid:job_id>/', AnalyticsJobDetailView.as_view(), name='analytics-job'),
+    path('analytics/live/', LiveViewsStreamView.as_view(), name='live-views'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
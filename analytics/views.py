@@ -1,21 +1,38 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from django.core.cache import cache
 from django_filters.rest_framework import DjangoFilterBackend
-from django.utils import timezone
-from django.db.models import F
-from datetime import timedelta
+from django_filters.utils import translate_validation
+import asyncio
 import hashlib
 import json
-from .models import User, Blog, BlogView
+import math
+import time
+from .models import User, Blog, BlogView, AnalyticsJob, ShardedBlogView
+from .guards import QueryBudgetExceeded, QueryGuard
 from .services import AnalyticsService
+from .jobs import (
+    ANALYTICS_KINDS, JobLimitExceeded, JobRunner,
+    blog_views_response, top_response, performance_response,
+)
+from .recorder import ViewRecorder
+from .broadcast import broadcaster
 from .serializers import (
-    UserSerializer, BlogSerializer, BlogViewSerializer,
+    UserSerializer, BlogSerializer, BlogViewSerializer, BlogViewStatsSerializer,
     BlogViewsAnalyticsSerializer, TopAnalyticsSerializer, PerformanceAnalyticsSerializer
 )
 from .filters import BlogFilter, BlogViewFilter
+from .fieldsets import SparseFields, SparseFieldsMixin
+from .middleware import note_write
+from .routers import shard_for_blog, view_shards
 
 class BaseAnalyticsView(APIView):
 
@@ -50,6 +67,7 @@ class BaseAnalyticsView(APIView):
         return filters_config
 
 class BlogViewsAnalyticsView(BaseAnalyticsView):
+    cache_timeout = 60 * 5
 
     def _get_cache_key(self, request):
       
@@ -94,16 +112,15 @@ class BlogViewsAnalyticsView(BaseAnalyticsView):
         filters_config = self.get_filters_config(request)
 
         try:
-            result = AnalyticsService.get_blog_views_analytics(
-                object_type=data['object_type'],
-                range_type=data['range'],
-                filters_config=filters_config,
-            )
-            response_data = {'data': result}
+            response_data = JobRunner.stored_result('blog-views', data, filters_config, self.cache_timeout)
+            if response_data is None:
+                response_data = blog_views_response(data, filters_config)
             
        
-            cache.set(cache_key, response_data, 60 * 5)
+            cache.set(cache_key, response_data, self.cache_timeout)
             return Response(response_data)
+        except QueryBudgetExceeded as e:
+            return Response({'error': str(e)}, status=e.status_code)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -111,6 +128,7 @@ class BlogViewsAnalyticsView(BaseAnalyticsView):
             )
 
 class TopAnalyticsView(BaseAnalyticsView):
+    cache_timeout = 60 * 10
 
     def _get_cache_key(self, request):
         
@@ -155,16 +173,15 @@ class TopAnalyticsView(BaseAnalyticsView):
         filters_config = self.get_filters_config(request)
 
         try:
-            result = AnalyticsService.get_top_analytics(
-                top_type=data['top'],
-                filters_config=filters_config,
-                time_range=data.get('time_range'),
-            )
-            response_data = {'data': result}
+            response_data = JobRunner.stored_result('top', data, filters_config, self.cache_timeout)
+            if response_data is None:
+                response_data = top_response(data, filters_config)
             
   
-            cache.set(cache_key, response_data, 60 * 10)
+            cache.set(cache_key, response_data, self.cache_timeout)
             return Response(response_data)
+        except QueryBudgetExceeded as e:
+            return Response({'error': str(e)}, status=e.status_code)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -172,6 +189,7 @@ class TopAnalyticsView(BaseAnalyticsView):
             )
 
 class PerformanceAnalyticsView(BaseAnalyticsView):
+    cache_timeout = 60 * 2
 
     def _get_cache_key(self, request):
        
@@ -215,16 +233,15 @@ class PerformanceAnalyticsView(BaseAnalyticsView):
         filters_config = self.get_filters_config(request)
 
         try:
-            result = AnalyticsService.get_performance_analytics(
-                compare=data['compare'],
-                user_id=data.get('user_id'),
-                filters_config=filters_config,
-            )
-            response_data = {'data': result}
+            response_data = JobRunner.stored_result('performance', data, filters_config, self.cache_timeout)
+            if response_data is None:
+                response_data = performance_response(data, filters_config)
             
            
-            cache.set(cache_key, response_data, 60 * 2)
+            cache.set(cache_key, response_data, self.cache_timeout)
             return Response(response_data)
+        except QueryBudgetExceeded as e:
+            return Response({'error': str(e)}, status=e.status_code)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -232,54 +249,249 @@ class PerformanceAnalyticsView(BaseAnalyticsView):
             )
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class AnalyticsJobsView(BaseAnalyticsView):
+    """
+    Submit an analytics request to run in the background.
+
+    The body names the ``kind`` (``blog-views``, ``top`` or ``performance``),
+    its ``params`` as accepted by that endpoint, and optional ``filters``.
+    Answers 202 with the job to poll, or 200 when an identical request has
+    already finished and its result is still fresh.
+    """
+
+    def post(self, request):
+        body = request.data
+        kind = body.get('kind')
+        if kind not in ANALYTICS_KINDS:
+            return Response(
+                {'kind': [f"Must be one of: {', '.join(ANALYTICS_KINDS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer_class, _ = ANALYTICS_KINDS[kind]
+        serializer = serializer_class(data=body.get('params') or {})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        filters_config = body.get('filters') or None
+        if isinstance(filters_config, str):
+            try:
+                filters_config = json.loads(filters_config)
+            except json.JSONDecodeError:
+                filters_config = None
+
+        try:
+            QueryGuard.check_filters(filters_config)
+            job, _ = JobRunner.submit(kind, serializer.validated_data, filters_config, self._client(request))
+        except QueryBudgetExceeded as e:
+            return Response({'error': str(e)}, status=e.status_code)
+        except JobLimitExceeded as e:
+            return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        response_status = status.HTTP_200_OK if job.status == AnalyticsJob.DONE else status.HTTP_202_ACCEPTED
+        url = reverse('analytics-job', args=[job.pk])
+        return Response(
+            {'id': job.pk, 'status': job.status, 'url': url},
+            status=response_status,
+            headers={'Location': url},
+        )
+
+    @staticmethod
+    def _client(request):
+        if request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+class AnalyticsJobDetailView(View):
+    """
+    Status of a background job, with its result or error once finished.
+    ``?wait=N`` holds the request for up to N seconds (capped at
+    ``ANALYTICS_JOB_MAX_WAIT``) until the job finishes.
+    """
+
+    poll_seconds = 0.25
+
+    async def get(self, request, job_id):
+        try:
+            wait = float(request.GET.get('wait', 0))
+        except ValueError:
+            wait = math.nan
+        if not math.isfinite(wait):
+            return HttpResponseBadRequest('wait must be a number of seconds')
+        wait = min(max(wait, 0), getattr(settings, 'ANALYTICS_JOB_MAX_WAIT', 30))
+
+        deadline = time.monotonic() + wait
+        while True:
+            job = await sync_to_async(AnalyticsJob.objects.filter(pk=job_id).first)()
+            if job is None:
+                return JsonResponse({'error': 'Job not found.'}, status=404)
+            if job.status in (AnalyticsJob.DONE, AnalyticsJob.FAILED) or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(self.poll_seconds)
+
+        data = {
+            'id': job.pk,
+            'kind': job.kind,
+            'status': job.status,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+        if job.status == AnalyticsJob.DONE:
+            data['result'] = job.result
+        elif job.status == AnalyticsJob.FAILED:
+            data['error'] = job.error
+        return JsonResponse(data, encoder=DjangoJSONEncoder)
+
+
+class LiveViewsStreamView(View):
+    """
+    Server-Sent Events stream of recorded views.
+
+    Sends a ``snapshot`` of the top blogs on connect, then ``views`` events
+    with per-blog count deltas (and the new top list when it changes) at
+    most once per ``ANALYTICS_LIVE_INTERVAL``. ``?blogs=1,2`` limits deltas
+    to those blogs. Needs the ASGI application to stream without holding a
+    worker thread per client.
+    """
+
+    keepalive_seconds = 15
+
+    async def get(self, request):
+        blog_ids = None
+        if request.GET.get('blogs'):
+            try:
+                blog_ids = {int(value) for value in request.GET['blogs'].split(',')}
+            except ValueError:
+                return HttpResponseBadRequest('blogs must be a comma separated list of ids')
+
+        seq = await sync_to_async(broadcaster.subscribe)()
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        if last_event_id.isdigit() and int(last_event_id) <= seq:
+            seq = int(last_event_id)
+
+        response = StreamingHttpResponse(
+            self._events(seq, blog_ids), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def _events(self, seq, blog_ids):
+        try:
+            yield self._format('snapshot', seq, {'top': self._format_top(broadcaster.top())})
+            last_sent = time.monotonic()
+
+            while True:
+                await asyncio.sleep(broadcaster.interval())
+                seq, deltas, top = broadcaster.changes_since(seq)
+
+                if deltas is None:
+                    yield self._format('resync', seq, {'top': self._format_top(top)})
+                    last_sent = time.monotonic()
+                    continue
+
+                if blog_ids is not None:
+                    deltas = {
+                        blog_id: delta for blog_id, delta in deltas.items()
+                        if blog_id in blog_ids
+                    }
+                if deltas or top is not None:
+                    data = {'deltas': {str(blog_id): delta for blog_id, delta in deltas.items()}}
+                    if top is not None:
+                        data['top'] = self._format_top(top)
+                    yield self._format('views', seq, data)
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= self.keepalive_seconds:
+                    yield ': keepalive\n\n'
+                    last_sent = time.monotonic()
+        finally:
+            await sync_to_async(broadcaster.unsubscribe)()
+
+    @staticmethod
+    def _format(event, seq, data):
+        return f"event: {event}\nid: {seq}\ndata: {json.dumps(data)}\n\n"
+
+    @staticmethod
+    def _format_top(top):
+        return [{'blog_id': blog_id, 'views': views} for blog_id, views in top]
+
+
+class UserViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.select_related('country').all()
     serializer_class = UserSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['country']
 
-class BlogViewSet(viewsets.ReadOnlyModelViewSet):
+class BlogViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Blog.objects.select_related('author', 'author__country').all()
     serializer_class = BlogSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = BlogFilter
+
+    def list(self, request, *args, **kwargs):
+        params = self._view_stats_params()
+        response = super().list(request, *args, **kwargs)
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        try:
+            self._add_view_stats(rows, params)
+        except QueryBudgetExceeded as e:
+            return Response({'error': str(e)}, status=e.status_code)
+        return response
     
     def retrieve(self, request, *args, **kwargs):
       
+        # Reject bad parameters before the view is recorded.
+        params = self._view_stats_params()
+        self.requested_fields()
         instance = self.get_object()
         
 
         self._record_view(instance)
         
         serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        data = serializer.data
+        try:
+            self._add_view_stats([data], params)
+        except QueryBudgetExceeded as e:
+            return Response({'error': str(e)}, status=e.status_code)
+        return Response(data)
+
+    def requested_fields(self):
+        names = super().requested_fields()
+        # View stats are matched to blogs by id.
+        if names is not None and 'id' not in names and self._view_stats_params()['include']:
+            names.append('id')
+        return names
+
+    def _view_stats_params(self):
+        serializer = BlogViewStatsSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def _add_view_stats(self, rows, params):
+        """
+        Embed ``?include=total_views,sparkline`` for every blog in ``rows``
+        from one grouped query, instead of a blog-views request per blog.
+        """
+        include = params['include']
+        if not include:
+            return
+
+        days = 0
+        if 'sparkline' in include:
+            days = params.get('sparkline_days') or getattr(settings, 'ANALYTICS_SPARKLINE_DAYS', 14)
+        history = AnalyticsService.get_blog_view_history([row['id'] for row in rows], days)
+        for row in rows:
+            for name in ('total_views', 'sparkline'):
+                if name in include:
+                    row[name] = history[row['id']][name]
     
     def _record_view(self, blog):
        
-        now = timezone.now()
-        
-        try:
-     
-            blog_view, created = BlogView.objects.get_or_create(
-                blog=blog,
-                defaults={'count': 1, 'viewed_at': now}
-            )
-            
-            if not created:
-     
-                BlogView.objects.filter(id=blog_view.id).update(
-                    count=F('count') + 1,
-                    viewed_at=now
-                )
-        except Exception as e:
-      
-            try:
-                BlogView.objects.filter(blog=blog).update(
-                    count=F('count') + 1,
-                    viewed_at=now
-                )
-            except:
-                BlogView.objects.create(blog=blog, count=1, viewed_at=now)
+        ViewRecorder.record(blog)
+        note_write(self.request)
     
     @action(detail=True, methods=['post'])
     def record_view(self, request, pk=None):
@@ -295,8 +507,71 @@ class BlogViewSet(viewsets.ReadOnlyModelViewSet):
             status=status.HTTP_200_OK
         )
 
-class BlogViewViewSet(viewsets.ReadOnlyModelViewSet):
+class BlogViewViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Raw view rows. With ``ANALYTICS_VIEW_SHARDS`` set they live on the
+    shards: ``?blog=`` reads that blog's shard, other lists read every
+    shard, and blog columns are looked up on ``default``.
+    """
     queryset = BlogView.objects.select_related('blog', 'blog__author').all()
     serializer_class = BlogViewSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = BlogViewFilter
+
+    def list(self, request, *args, **kwargs):
+        if not view_shards():
+            return super().list(request, *args, **kwargs)
+
+        rows = self._sharded_rows(self._shard_querysets())
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(rows)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not view_shards():
+            return super().retrieve(request, *args, **kwargs)
+
+        querysets = self._shard_querysets()
+        # Row ids are only unique within a shard.
+        if len(querysets) > 1:
+            return Response(
+                {'blog': ['Required to look up a single view row when views are sharded.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        rows = self._sharded_rows([querysets[0].filter(pk=kwargs['pk'])])
+        if not rows:
+            raise Http404
+        return Response(rows[0])
+
+    def _shard_querysets(self):
+        """The filtered rows of every shard that can hold matches."""
+        filterset = self.filterset_class(
+            self.request.query_params, queryset=ShardedBlogView.objects.none(), request=self.request
+        )
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        blog = filterset.form.cleaned_data.get('blog')
+        aliases = [shard_for_blog(blog.pk)] if blog else view_shards()
+        return [
+            filterset.filter_queryset(ShardedBlogView.objects.using(alias).all())
+            for alias in aliases
+        ]
+
+    def _sharded_rows(self, querysets):
+        columns = SparseFields.columns(self.get_serializer_class()().fields, self.requested_fields())
+        local = [column for _, column, _ in columns if not column.startswith('blog__')]
+        # Shards cannot join to blogs; those columns come from default.
+        joined = [column[len('blog__'):] for _, column, _ in columns if column.startswith('blog__')]
+
+        values = []
+        for queryset in querysets:
+            values += queryset.values(*local, *([] if 'blog' in local else ['blog']))
+        if joined:
+            blogs = Blog.objects.filter(pk__in={row['blog'] for row in values}).values('id', *joined)
+            blogs = {blog['id']: blog for blog in blogs}
+            for row in values:
+                blog = blogs.get(row['blog'], {})
+                for column in joined:
+                    row[f'blog__{column}'] = blog.get(column)
+        return SparseFields.rows(values, columns)
@@ -33,6 +33,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'analytics.middleware.replica_read_middleware',
 ]
 
 ROOT_URLCONF = 'analytics_test.urls'
@@ -62,6 +63,34 @@ DATABASES = {
     }
 }
 
+# Optional hash-sharded view storage: one SQLite file per shard. Create the
+# tables with `python manage.py migrate --database views_<n>`.
+ANALYTICS_VIEW_SHARDS = [
+    f'views_{i}' for i in range(int(os.environ.get('ANALYTICS_SHARD_COUNT', '0')))
+]
+for _alias in ANALYTICS_VIEW_SHARDS:
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{_alias}.sqlite3',
+    }
+
+# Optional read replicas for analytics GETs. Locally each is a SQLite snapshot
+# of db.sqlite3, kept fresh by `python manage.py refresh_replica --interval 5`.
+ANALYTICS_READ_REPLICAS = [
+    f'replica_{i}' for i in range(int(os.environ.get('ANALYTICS_REPLICA_COUNT', '0')))
+]
+for _alias in ANALYTICS_READ_REPLICAS:
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{_alias}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = [
+    'analytics.routers.ViewShardRouter',
+    'analytics.routers.ReadReplicaRouter',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,5 +132,10 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
+        # Sealed analytics buckets are cached per day, so a year-long window
+        # needs far more entries than the default of 300.
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
     }
 }
\ No newline at end of file